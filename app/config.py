@@ -2,7 +2,7 @@
 Application configuration using Pydantic Settings
 """
 
-from typing import List, Optional
+from typing import List, Optional, Tuple, Dict
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field, field_validator
 
@@ -20,33 +20,97 @@ class Settings(BaseSettings):
         ...,
         description="PostgreSQL connection string"
     )
+    db_schema_mode: str = Field(default="auto", pattern="^(auto|generate|check)$")
+    db_migrations_dir: str = Field(default="migrations")
+    db_schema_check_redis: bool = Field(default=False)
+    db_schema_check_ttl: int = Field(default=7 * 24 * 3600, ge=60)
 
     discord_client_id: str = Field(...)
     discord_client_secret: str = Field(...)
     discord_redirect_uri: str = Field(...)
+    discord_api_base: str = Field(default="https://discord.com/api")
+    discord_http2: bool = Field(default=True)
+    discord_max_connections: int = Field(default=20, ge=1)
+    discord_max_keepalive: int = Field(default=20, ge=0)
+    discord_keepalive_expiry: float = Field(default=60.0, gt=0)
+    discord_timeout: float = Field(default=10.0, gt=0)
 
     proxmox_host: str = Field(...)
     proxmox_user: str = Field(default="root@pam")
     proxmox_password: str = Field(...)
     proxmox_verify_ssl: bool = Field(default=False)
     proxmox_node: str = Field(default="pve")
+    proxmox_transport: str = Field(default="async", pattern="^(async|thread)$")
+    proxmox_max_concurrency: int = Field(default=16, ge=1)
+    proxmox_timeout: float = Field(default=30.0, gt=0)
+    proxmox_nodes: str = Field(default="", description="Nodes eligible for placement, empty for all")
+    proxmox_node_templates: str = Field(default="", description="Per-node template ids as node:vmid,...")
+    proxmox_storage: str = Field(default="local-lvm")
+    proxmox_placement_policy: str = Field(default="spread", pattern="^(spread|binpack)$")
+    proxmox_cluster_cache_ttl: float = Field(default=10.0, gt=0)
+    proxmox_inventory_refresh: float = Field(default=5.0, gt=0)
+    proxmox_inventory_ttl: float = Field(default=15.0, gt=0)
+    proxmox_config_ttl: float = Field(default=60.0, ge=0)
+    proxmox_inventory_redis: bool = Field(default=False)
+    proxmox_bulk_concurrency: int = Field(default=8, ge=1)
+    proxmox_bulk_node_rate: float = Field(default=2.0, gt=0, description="Bulk actions per second per node")
+    proxmox_bulk_task_timeout: int = Field(default=300, ge=1)
+    proxmox_migrate_storage: str = Field(default="local-lvm")
+    proxmox_clone_throughput: float = Field(default=200.0, gt=0, description="Full clone copy rate in MB/s")
+    proxmox_linked_clone_seconds: float = Field(default=5.0, ge=0)
 
     unifi_host: str = Field(...)
     unifi_port: int = Field(default=8442)
     unifi_username: str = Field(...)
     unifi_password: str = Field(default="default")
     unifi_verify_ssl: bool = Field(default=False)
+    unifi_site: str = Field(default="default")
+    unifi_session_ttl: float = Field(default=1800.0, gt=0)
+    unifi_rule_sync_interval: float = Field(default=30.0, gt=0)
+    unifi_rule_prefix: str = Field(default="exv2-")
+    unifi_reconcile_concurrency: int = Field(default=16, ge=1)
 
     vps_ssh_port_range_start: int = Field(default=20000)
     vps_ssh_port_range_end: int = Field(default=30000)
+    vps_port_lease_ttl: int = Field(default=900, ge=1)
+    vps_port_allocator_redis: bool = Field(default=False)
     vps_default_memory: int = Field(default=4096)
     vps_default_cores: int = Field(default=4)
     vps_default_disk: int = Field(default=20)
     vps_template_id: int = Field(default=9000)
+    vps_clone_strategy: str = Field(default="full", pattern="^(full|linked|linked_then_full)$")
+    vps_warm_pool_size: int = Field(default=0, ge=0)
+    vps_warm_pool_profiles: str = Field(default="")
+    vps_warm_pool_refill_concurrency: int = Field(default=2, ge=1)
+
+    ip_resolve_timeout: float = Field(default=120.0, gt=0)
+    ip_resolve_concurrency: int = Field(default=8, ge=1)
+
+    metrics_interval: float = Field(default=60.0, gt=0)
+    metrics_points_1m: int = Field(default=360, ge=1)
+    metrics_points_5m: int = Field(default=576, ge=1)
+    metrics_points_1h: int = Field(default=720, ge=1)
 
     redis_url: str = Field(default="redis://localhost:6379/0")
 
+    audit_queue_size: int = Field(default=10000, ge=1)
+    audit_batch_size: int = Field(default=500, ge=1)
+    audit_flush_interval: float = Field(default=1.0, gt=0)
+    audit_put_timeout: float = Field(default=0.5, ge=0)
+    audit_partitions_ahead: int = Field(default=3, ge=1)
+    audit_retention_months: int = Field(default=0, ge=0)
+    audit_archive_dir: str = Field(default="archive/audit_logs")
+
+    pagination_count_ttl: float = Field(default=60.0, ge=0)
+
     admin_discord_ids: str = Field(default="")
+    auth_principal_ttl: float = Field(default=30.0, ge=0)
+    auth_principal_redis: bool = Field(default=False)
+    auth_access_token_ttl: int = Field(default=900, ge=60)
+    auth_refresh_token_ttl: int = Field(default=30 * 24 * 3600, ge=60)
+    auth_revocation_redis: bool = Field(default=False)
+    auth_revocation_capacity: int = Field(default=100000, ge=1)
+    auth_revocation_sync_interval: float = Field(default=5.0, gt=0)
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -66,6 +130,43 @@ class Settings(BaseSettings):
             if i.strip()
         ]
 
+    @property
+    def proxmox_nodes_list(self) -> List[str]:
+        """Parse placement-eligible node names into a list"""
+        return [
+            n.strip() for
+            n in self.proxmox_nodes.split(",")
+            if n.strip()
+        ]
+
+    @property
+    def node_templates(self) -> Dict[str, int]:
+        """Parse per-node template ids ("node:vmid,...") into a dict"""
+        pairs = [
+            p.strip().split(":") for
+            p in self.proxmox_node_templates.split(",")
+            if p.strip()
+        ]
+        return {node: int(vmid) for node, vmid in pairs}
+
+    @property
+    def warm_pool_profiles(self) -> List[Tuple[int, int, int]]:
+        """Parse warm pool profiles ("memory:cores:disk,...") into tuples"""
+        if not self.vps_warm_pool_profiles:
+            return []
+        return [
+            tuple(int(v) for v in p.strip().split(":"))
+            for p in self.vps_warm_pool_profiles.split(",")
+            if p.strip()
+        ]
+
+    @property
+    def db_generate_schemas(self) -> bool:
+        """Generate schemas on startup instead of checking aerich migrations"""
+        if self.db_schema_mode == "auto":
+            return self.app_env in ("development", "test")
+        return self.db_schema_mode == "generate"
+
     @property
     def is_production(self) -> bool:
         """Check if running in production"""
@@ -2,11 +2,23 @@
 Database configuration and utilities using Tortoise ORM
 """
 
+import os
+import re
+from typing import Optional
+
 from tortoise import Tortoise
 from tortoise.contrib.fastapi import register_tortoise
+from tortoise.exceptions import OperationalError
 from fastapi import FastAPI
+from loguru import logger
 from app.config import settings
 
+MIGRATION_RE = re.compile(r"^(\d+)_.+\.py$")
+
+
+class SchemaDriftError(RuntimeError):
+    """Raised when the database is not at this deploy's aerich migration"""
+
 
 TORTOISE = {
     "connections": {
@@ -23,15 +35,99 @@ TORTOISE = {
 }
 
 async def init_db(app: FastAPI) -> None:
-    """Initialize database connection with Tortoise"""
+    """
+    Initialize database connection with Tortoise
+
+    Schemas are only generated in dev/test (see `db_schema_mode`);
+    otherwise the app lifespan runs `check_schema` instead
+    """
 
     register_tortoise(
         app,
         config=TORTOISE,
-        generate_schemas=True,
+        generate_schemas=settings.db_generate_schemas,
         add_exception_handlers=True,
     )
 
+def expected_migration(app_label: str = "models") -> Optional[str]:
+    """Latest aerich migration file shipped with this deploy"""
+    path = os.path.join(settings.db_migrations_dir, app_label)
+    if not os.path.isdir(path):
+        return None
+
+    versions = [name for name in os.listdir(path) if MIGRATION_RE.match(name)]
+    return max(
+        versions,
+        key=lambda name: int(MIGRATION_RE.match(name).group(1)),
+        default=None
+    )
+
+async def applied_migration(app_label: str = "models") -> Optional[str]:
+    """Latest aerich migration recorded in the database"""
+    conn = Tortoise.get_connection("default")
+    placeholder = "$1" if conn.capabilities.dialect == "postgres" else "?"
+
+    try:
+        rows = await conn.execute_query_dict(
+            f"SELECT version FROM aerich WHERE app = {placeholder} ORDER BY id DESC LIMIT 1",
+            [app_label]
+        )
+    except OperationalError:
+        # aerich init-db has never run
+        return None
+    return rows[0]["version"] if rows else None
+
+async def check_schema(app_label: str = "models") -> None:
+    """
+    Refuse to start unless the database is at this deploy's migration
+
+    One query against the aerich table; with `db_schema_check_redis`, a
+    successful check is remembered per expected version, so the workers
+    of a deploy after the first skip even that
+
+    Raises:
+        SchemaDriftError: If the versions differ or there are no migrations
+    """
+    if settings.db_generate_schemas:
+        return
+
+    expected = expected_migration(app_label)
+    if expected is None:
+        raise SchemaDriftError(
+            f"No aerich migrations in {settings.db_migrations_dir}/{app_label}; "
+            f"run `aerich init-db` or set DB_SCHEMA_MODE=generate"
+        )
+
+    key = f"db:schema:{app_label}:{expected}"
+    cache = None
+    if settings.db_schema_check_redis:
+        import redis.asyncio as redis
+        cache = redis.from_url(settings.redis_url, decode_responses=True)
+
+    try:
+        if cache is not None:
+            try:
+                if await cache.exists(key):
+                    return
+            except Exception as e:
+                logger.warning(f"Schema check cache unavailable: {e}")
+
+        applied = await applied_migration(app_label)
+        if applied != expected:
+            raise SchemaDriftError(
+                f"Database is at migration {applied or 'none'}, this deploy expects "
+                f"{expected}; run `aerich upgrade` before starting"
+            )
+
+        if cache is not None:
+            try:
+                await cache.set(key, "1", ex=settings.db_schema_check_ttl)
+            except Exception as e:
+                logger.warning(f"Schema check cache unavailable: {e}")
+    finally:
+        if cache is not None:
+            await cache.aclose()
+
 async def close_db() -> None:
     """Close database connections gracefully"""
     await Tortoise.close_connections()
@@ -0,0 +1,76 @@
+"""
+Application lifespan: process-wide resources opened at startup and
+closed at shutdown
+
+Usage:
+    app = FastAPI(lifespan=lifespan)
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from loguru import logger
+
+from app.database import check_schema
+from app.models.lazy import build_all
+from app.services.audit import audit
+from app.services.audit_partitions import audit_partitions
+from app.services.discord_http import DiscordHTTP
+from app.services.metrics import MetricsCollector
+from app.services.port_allocator import port_allocator
+from app.services.principal import principals
+from app.services.proxmox import ProxmoxService
+from app.services.revocation import revocations
+from app.services.unifi import UnifiService
+
+
+async def warmup(app: FastAPI) -> None:
+    """
+    Connect upstream clients, load the UniFi rule mirror and build pydantic
+    models in the background, so startup does not wait on them and does
+    not fail if one is down
+    """
+    # On the loop: pydantic_model_creator must not race a request building
+    # the same model
+    build_all()
+    await app.state.proxmox.warmup()
+    try:
+        await app.state.unifi.connect()
+        await app.state.unifi.sync_rules()
+    except Exception as e:
+        logger.warning(f"UniFi warmup failed, connecting on first use: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared clients for the lifetime of the app"""
+    await check_schema()
+    DiscordHTTP.open()
+    principals.start()
+    await revocations.start()
+    audit.start()
+    await audit_partitions.start()
+    await port_allocator.start()
+    app.state.proxmox = ProxmoxService()
+    app.state.unifi = UnifiService()
+    app.state.unifi.start_sync()
+    app.state.metrics = MetricsCollector(app.state.proxmox)
+    app.state.metrics.start()
+    warming = asyncio.create_task(warmup(app))
+    try:
+        yield
+    finally:
+        warming.cancel()
+        await asyncio.gather(warming, return_exceptions=True)
+        await app.state.metrics.stop()
+        await app.state.unifi.stop_sync()
+        await app.state.unifi.disconnect()
+        await app.state.proxmox.close()
+        await port_allocator.stop()
+        await audit_partitions.stop()
+        # Before the DB connections close
+        await audit.stop()
+        await revocations.stop()
+        await principals.stop()
+        await DiscordHTTP.close()
@@ -3,9 +3,12 @@ models.Model[AuditLog] idk dude
 """
 
 from tortoise import fields, models
-from tortoise.contrib.pydantic import pydantic_model_creator
+from tortoise.queryset import QuerySet
+from datetime import datetime, timedelta, timezone
 from enum import Enum, auto
-from typing import Optional
+from typing import Optional, List
+
+from app.models.lazy import lazy_pydantic
 
 class LowerStr(str, Enum):
 
@@ -67,6 +70,47 @@ class AuditLog(models.Model):
     def __str__(self) -> str:
         return f"Audit: {self.action} by {self.user_id} at {self.created_at}"
 
+    @classmethod
+    def between(cls, start: datetime, end: Optional[datetime] = None) -> QuerySet["AuditLog"]:
+        """
+        Entries in [start, end)
+
+        Always bounding created_at lets a partitioned audit_logs table
+        scan only the months in range
+        """
+        return cls.filter(
+            created_at__gte=start,
+            created_at__lt=end or datetime.now(timezone.utc) + timedelta(seconds=1)
+        )
+
+    @classmethod
+    async def recent(
+        cls,
+        limit: int = 50,
+        window: timedelta = timedelta(days=7),
+        max_window: timedelta = timedelta(days=366),
+        **filters
+    ) -> List["AuditLog"]:
+        """
+        Latest entries, newest first
+
+        Looks back `window` first and doubles it until `limit` entries are
+        found or `max_window` is reached, so typical calls only touch the
+        newest partition
+
+        Args:
+            limit: Maximum number of entries
+            window: Initial look-back
+            max_window: Largest look-back
+            **filters: Extra filter() arguments, e.g. user_id
+        """
+        now = datetime.now(timezone.utc)
+        while True:
+            rows = await cls.between(now - window).filter(**filters).order_by("-created_at").limit(limit)
+            if len(rows) >= limit or window >= max_window:
+                return rows
+            window = min(window * 2, max_window)
+
     def to_dict(self) -> dict:
         """Convert audit log model to dict sadly"""
 
@@ -81,6 +125,7 @@ class AuditLog(models.Model):
             "metadata": self.metadata,
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
-AuditLog_Pydantic = pydantic_model_creator(
-    AuditLog, name="AuditLog"
+__getattr__ = lazy_pydantic(
+    __name__, AuditLog,
+    AuditLog_Pydantic=dict(name="AuditLog", exclude=("user", "user_id"))
 )
@@ -0,0 +1,71 @@
+"""
+On-demand pydantic_model_creator models
+
+Model modules declare their `*_Pydantic` models here instead of building
+them at import time; each is created on first attribute access through
+the module's `__getattr__` (PEP 562) and cached on the module.
+
+They are now built after Tortoise.init, when relations are resolved, so
+specs exclude the relation fields the import-time models never had
+"""
+
+import sys
+import threading
+from typing import Any, Callable, Dict, Type
+
+from tortoise import models
+
+# module name -> attribute -> (model, pydantic_model_creator kwargs)
+REGISTRY: Dict[str, Dict[str, tuple]] = {}
+
+_lock = threading.RLock()
+
+
+def lazy_pydantic(module: str, model: Type[models.Model], **specs: Dict[str, Any]) -> Callable[[str], Any]:
+    """
+    Register pydantic models for a model module
+
+    Args:
+        module: `__name__` of the model module
+        model: Tortoise model the pydantic models are built from
+        **specs: Attribute name -> pydantic_model_creator kwargs
+
+    Returns:
+        The module `__getattr__`
+    """
+    REGISTRY.setdefault(module, {}).update(
+        {name: (model, kwargs) for name, kwargs in specs.items()}
+    )
+
+    def __getattr__(name: str) -> Any:
+        if name in REGISTRY[module]:
+            return build(module, name)
+        raise AttributeError(f"module {module!r} has no attribute {name!r}")
+
+    return __getattr__
+
+
+def build(module: str, name: str) -> Any:
+    from tortoise.contrib.pydantic import pydantic_model_creator
+
+    # pydantic_model_creator is not safe to run concurrently
+    with _lock:
+        existing = vars(sys.modules[module]).get(name)
+        if existing is not None:
+            return existing
+
+        model, kwargs = REGISTRY[module][name]
+        created = pydantic_model_creator(model, **kwargs)
+        setattr(sys.modules[module], name, created)
+        return created
+
+
+def build_all() -> int:
+    """Create every registered model not built yet; used for warmup"""
+    built = 0
+    for module, names in REGISTRY.items():
+        for name in names:
+            if name not in vars(sys.modules[module]):
+                build(module, name)
+                built += 1
+    return built
@@ -2,9 +2,13 @@
 Model[PortForward]
 """
 
+from loguru import logger
 from tortoise import fields, models
-from tortoise.contrib.pydantic import pydantic_model_creator
-from typing import Optional
+from tortoise.transactions import in_transaction
+from typing import Optional, List, Dict, Any
+
+from app.config import settings
+from app.models.lazy import lazy_pydantic
 
 class PortForward(models.Model):
     """
@@ -40,6 +44,73 @@ class PortForward(models.Model):
     def __str__(self) -> str:
         return f"Port Forward {self.external_port} -> {self.internal_ip}:{self.internal_port}"
 
+    @property
+    def rule_name(self) -> str:
+        """Name of the controller rule, marks it as managed by us"""
+        return f"{settings.unifi_rule_prefix}{self.virtual_machine_id}-{self.external_port}" # type: ignore
+
+    @classmethod
+    async def create_batch(
+        cls,
+        unifi,
+        virtual_machine: "VirtualMachine",
+        rules: List[Dict[str, Any]]
+    ) -> List["PortForward"]:
+        """
+        Create a VM's forwards on the controller and in the DB together
+
+        Controller rules are submitted concurrently, then all rows are
+        inserted with one bulk insert in a transaction; if that fails the
+        controller rules are deleted again, and any that could not be are
+        logged
+
+        Args:
+            unifi: UnifiService
+            virtual_machine: VM the forwards point to
+            rules: external_port, internal_ip and optionally
+                internal_port, protocol, description per rule
+
+        Returns:
+            Saved PortForward rows
+        """
+
+        forwards = [
+            cls(virtual_machine=virtual_machine, is_active=True, **rule)
+            for rule in rules
+        ]
+
+        created = await unifi.create_port_forwards([
+            {
+                "name": pf.rule_name,
+                "external_port": pf.external_port,
+                "internal_ip": pf.internal_ip,
+                "internal_port": pf.internal_port,
+                "protocol": pf.protocol,
+            }
+            for pf in forwards
+        ])
+        for pf, rule in zip(forwards, created):
+            pf.unifi_rule_id = rule["_id"]
+
+        rule_ids = [pf.unifi_rule_id for pf in forwards]
+        try:
+            async with in_transaction() as conn:
+                await cls.bulk_create(forwards, using_db=conn)
+                # A bulk insert does not return ids on every backend
+                saved = {
+                    pf.unifi_rule_id: pf
+                    for pf in await cls.filter(unifi_rule_id__in=rule_ids).using_db(conn)
+                }
+        except Exception:
+            if not await unifi.delete_port_forwards(rule_ids):
+                logger.error(
+                    f"Rollback of port forwards for VM {virtual_machine.id} left "
+                    f"controller rules behind, check rule ids {rule_ids}"
+                )
+            raise
+
+        return [saved[rule_id] for rule_id in rule_ids]
+
     def to_dict(self) -> dict:
         """Convert PortForward to dict"""
 
@@ -56,7 +127,12 @@ class PortForward(models.Model):
             "created_at": self.created_at
         }
 
-PortForward_Pydantic = pydantic_model_creator(PortForward, name="PortForward")
-PortForwardIn_Pydantic = pydantic_model_creator(
-    PortForward, name="PortForwardIn", exclude_readonly=True
+__getattr__ = lazy_pydantic(
+    __name__, PortForward,
+    PortForward_Pydantic=dict(
+        name="PortForward", exclude=("virtual_machine", "virtual_machine_id")
+    ),
+    PortForwardIn_Pydantic=dict(
+        name="PortForwardIn", exclude_readonly=True, exclude=("virtual_machine_id",)
+    )
 )
\ No newline at end of file
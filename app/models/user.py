@@ -3,10 +3,11 @@ Model[User]
 """
 
 from tortoise import fields, models
-from tortoise.contrib.pydantic import pydantic_model_creator
 from datetime import datetime
 from typing import Optional
 
+from app.models.lazy import lazy_pydantic
+
 class User(models.Model):
     """
     User model with Discord OAuth integration
@@ -77,8 +78,11 @@ class User(models.Model):
             "is_admin": self.is_admin,
             "is_active": self.is_active,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-            "last_login": self.last_login.isoformat() if self.created_at else None
+            "last_login": self.last_login.isoformat() if self.last_login else None
         }
 
-User_Pydantic = pydantic_model_creator(User, name="User")
-UserIn_Pydantic = pydantic_model_creator(User, name="UserIn", exclude_readonly=True)
\ No newline at end of file
+__getattr__ = lazy_pydantic(
+    __name__, User,
+    User_Pydantic=dict(name="User", exclude=("audit_logs", "virtual_machines")),
+    UserIn_Pydantic=dict(name="UserIn", exclude_readonly=True)
+)
\ No newline at end of file
@@ -5,10 +5,11 @@ Tracks VM State, config, usage and ownership and stuff
 """
 
 from tortoise import fields, models
-from tortoise.contrib.pydantic import pydantic_model_creator
 from enum import Enum, auto
 from typing import Optional
 
+from app.models.lazy import lazy_pydantic
+
 class LowerStr(str, Enum):
 
     def _generate_next_value_(name, start, count, last_values):
@@ -25,6 +26,12 @@ class VMStatus(LowerStr):
     DELETING = auto()
     DELETED = auto()
 
+class CloneStrategy(LowerStr):
+    """How a VM disk is cloned from the template"""
+    FULL = auto()
+    LINKED = auto()
+    LINKED_THEN_FULL = auto()
+
 class VirtualMachine(models.Model):
     """
     Virtual Machine model linked to Proxmox QEMU VMs
@@ -111,7 +118,12 @@ class VirtualMachine(models.Model):
             "stopped_at": self.stopped_at.isoformat() if self.stopped_at else None
         }
 
-VirtualMachine_Pydantic = pydantic_model_creator(VirtualMachine, name="VirtualMachine")
-VirtualMachineIn_Pydantic = pydantic_model_creator(
-    VirtualMachine, name="VirtualMachineIn", exclude_readonly=True
+__getattr__ = lazy_pydantic(
+    __name__, VirtualMachine,
+    VirtualMachine_Pydantic=dict(
+        name="VirtualMachine", exclude=("owner", "owner_id", "port_forwards")
+    ),
+    VirtualMachineIn_Pydantic=dict(
+        name="VirtualMachineIn", exclude_readonly=True, exclude=("owner_id",)
+    )
 )
\ No newline at end of file
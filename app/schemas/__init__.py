@@ -9,11 +9,23 @@ from app.schemas.vm import (
     VMCreate,
     VMUpdate,
     VMAction,
-    VMStats
+    VMBulkAction,
+    VMBulkProgress,
+    VMStats,
+    VMStatsRequest,
+    VMUsageSeries,
+    CloneEstimate
 )
-from app.schemas.ports import PortForwardResponse, PortForwardCreate, PortForwardUpdate
-from app.schemas.auth import TokenResponse, DiscordTokenResponse, DiscordUser
-from app.schemas.common import MessageResponse, PaginatedResponse, ErrorResponse
+from app.schemas.ports import (
+    PortForwardResponse,
+    PortForwardCreate,
+    PortForwardBatchCreate,
+    PortForwardUpdate,
+    PortForwardSyncItem,
+    PortForwardSyncReport
+)
+from app.schemas.auth import TokenResponse, RefreshRequest, DiscordTokenResponse, DiscordUser
+from app.schemas.common import MessageResponse, PaginatedResponse, CursorPage, ErrorResponse
 
 __all__ = (
     "UserResponse",
@@ -21,17 +33,27 @@ __all__ = (
     "UserCreate",
     "UserUpdate",
     "VMStats",
+    "VMStatsRequest",
+    "VMUsageSeries",
+    "CloneEstimate",
     "VMUpdate",
     "VMAction",
+    "VMBulkAction",
+    "VMBulkProgress",
     "VMCreate",
     "VMResponse",
     "PortForwardCreate",
+    "PortForwardBatchCreate",
     "PortForwardResponse",
     "PortForwardUpdate",
+    "PortForwardSyncItem",
+    "PortForwardSyncReport",
     "TokenResponse",
+    "RefreshRequest",
     "DiscordUser",
     "DiscordTokenResponse",
     "MessageResponse",
     "PaginatedResponse",
+    "CursorPage",
     "ErrorResponse"
 )
\ No newline at end of file
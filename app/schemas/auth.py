@@ -10,8 +10,13 @@ class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
     expires_in: Optional[int] = None
+    refresh_token: Optional[str] = None
     user: "UserResponse"
 
+class RefreshRequest(BaseModel):
+    """Refresh token exchange request"""
+    refresh_token: str
+
 class DiscordUser(BaseModel):
     """Discord user information from OAuth"""
     id: str
@@ -38,6 +38,38 @@ class PaginatedResponse(BaseModel, Generic[T]):
             items=items, total=total, page=page, page_size=page_size, pages=pages
         )
 
+class CursorPage(BaseModel, Generic[T]):
+    """
+    Keyset paginated resp
+
+    `next_cursor` is opaque; pass it back as `cursor` for the next page.
+    `total` is only set when asked for, and may be an estimate
+    """
+    items: List[T]
+    page_size: int = Field(ge=1, le=100)
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+    total_is_estimate: bool = False
+
+    @classmethod
+    def create(
+            cls,
+            items: List[T],
+            page_size: int,
+            next_cursor: Optional[str] = None,
+            total: Optional[int] = None,
+            total_is_estimate: bool = False
+    ):
+        """Create cursor paginated response"""
+
+        return cls(
+            items=items,
+            page_size=page_size,
+            next_cursor=next_cursor,
+            total=total,
+            total_is_estimate=total_is_estimate
+        )
+
 class ErrorResponse(BaseModel):
     """Error response"""
 
@@ -3,14 +3,14 @@ Port Forward schemas for req-rep validation
 """
 
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 class PortForwardBase(BaseModel):
     """Base port forward schema"""
     external_port: int = Field(..., ge=1024, le=65535)
     internal_port: int = Field(default=22, ge=1, le=65535)
-    internal_ip: str = Field(..., pattern="^(?:[0-9{1,3}\.){3}[0-9]{1,3}$")
+    internal_ip: str = Field(..., pattern=r"^(?:[0-9]{1,3}\.){3}[0-9]{1,3}$")
     protocol: str = Field(default="tcp", pattern="^(tcp|udp|both)$")
     description: Optional[str] = Field(None, max_length=500)
 
@@ -18,6 +18,11 @@ class PortForwardCreate(PortForwardBase):
     """Schema for creating a port forward"""
     vm_id: int
 
+class PortForwardBatchCreate(BaseModel):
+    """Schema for creating all forwards of a VM at once"""
+    vm_id: int
+    rules: List[PortForwardBase] = Field(..., min_length=1, max_length=32)
+
 class PortForwardUpdate(BaseModel):
     """Schema for updating a port forward"""
     is_active: Optional[bool] = None
@@ -32,4 +37,24 @@ class PortForwardResponse(PortForwardBase):
     created_at: datetime
     updated_at: datetime
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class PortForwardSyncItem(BaseModel):
+    """One planned reconciliation step"""
+    op: str = Field(..., pattern="^(create|update|delete|adopt)$")
+    port_forward_id: Optional[int] = None
+    rule_id: Optional[str] = None
+    external_port: Optional[int] = None
+    changes: Dict[str, Any] = Field(default_factory=dict)
+    error: Optional[str] = None
+
+class PortForwardSyncReport(BaseModel):
+    """Result of reconciling PortForward rows with the controller"""
+    dry_run: bool
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    adopted: int = 0
+    failed: int = 0
+    duration: float = 0
+    plan: List[PortForwardSyncItem] = Field(default_factory=list)
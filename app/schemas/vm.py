@@ -2,10 +2,10 @@
 Virtual Machine schemas for req-rep validation
 """
 
-from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, List
+from pydantic import BaseModel, Field, ConfigDict, model_validator
+from typing import Optional, List, Tuple
 from datetime import datetime
-from app.models.vm import VMStatus
+from app.models.vm import VMStatus, CloneStrategy
 
 class VMBase(BaseModel):
     """Base VM schema"""
@@ -18,7 +18,9 @@ class VMBase(BaseModel):
 
 class VMCreate(VMBase):
     """Schema for creating a new Virtual Machine"""
-    pass
+    clone_strategy: Optional[CloneStrategy] = Field(
+        None, description="Clone strategy, defaults to the configured plan default"
+    )
 
 class VMUpdate(BaseModel):
     """Schema for updating a VM"""
@@ -33,6 +35,34 @@ class VMAction(BaseModel):
     """Schema for VM Actions"""
     action: str = Field(..., pattern="^(start|stop|restart|suspend|delete)$")
 
+class VMBulkAction(BaseModel):
+    """Bulk VM action over explicit vmids or a filter"""
+    action: str = Field(..., pattern="^(start|stop|restart|suspend|delete)$")
+    vmids: Optional[List[int]] = Field(None, min_length=1, max_length=5000)
+    owner_id: Optional[int] = None
+    node: Optional[str] = None
+    status: Optional[VMStatus] = None
+    concurrency: Optional[int] = Field(None, ge=1, le=64)
+
+    @property
+    def has_filter(self) -> bool:
+        return any(v is not None for v in (self.owner_id, self.node, self.status))
+
+    @model_validator(mode="after")
+    def check_selector(self) -> "VMBulkAction":
+        if (self.vmids is None) == (not self.has_filter):
+            raise ValueError("Provide exactly one of vmids or a filter (owner_id, node, status)")
+        return self
+
+class VMBulkProgress(BaseModel):
+    """Progress event for one VM of a bulk action"""
+    vmid: int
+    action: str
+    success: bool
+    error: Optional[str] = None
+    done: int
+    total: int
+
 class VMResponse(VMBase):
     """Schema for VM Response"""
     id: int
@@ -67,6 +97,33 @@ class VMStats(BaseModel):
     uptime: Optional[int] = None
     network_in: Optional[int] = None
     network_out: Optional[int] = None
+    stale: bool = False
+
+class VMUsageSeries(BaseModel):
+    """Locally collected usage series for graphs and billing"""
+    vmid: int
+    metric: str = Field(..., pattern="^(cpu|mem|netin|netout|diskread|diskwrite)$")
+    resolution: str = Field("1m", pattern="^(1m|5m|1h)$")
+    points: List[Tuple[int, float]]
+
+class VMStatsRequest(BaseModel):
+    """Batch stats request, by VM ids or for every VM of an owner"""
+    vm_ids: Optional[List[int]] = Field(None, max_length=1000)
+    owner_id: Optional[int] = None
+
+    @model_validator(mode="after")
+    def check_selector(self) -> "VMStatsRequest":
+        if (self.vm_ids is None) == (self.owner_id is None):
+            raise ValueError("Provide exactly one of vm_ids or owner_id")
+        return self
+
+class CloneEstimate(BaseModel):
+    """Expected storage and time cost of a clone strategy"""
+    strategy: CloneStrategy
+    initial_storage_gb: float
+    final_storage_gb: float
+    ready_seconds: float
+    background_seconds: float = 0
 
 class VMListResponse(BaseModel):
     """Response for VM List with paginator"""
@@ -0,0 +1,172 @@
+"""
+Buffered AuditLog writer
+
+Requests enqueue entries in memory; a background task writes them with
+bulk_create once `audit_batch_size` entries are waiting or
+`audit_flush_interval` has passed, whichever comes first
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+
+from loguru import logger
+
+from app.config import settings
+from app.models import AuditLog
+from app.models.audit import AuditAction
+
+
+class AuditWriter:
+    """
+    Bounded in-memory queue of AuditLog rows with a batching flusher
+
+    When the queue is full, `log` waits up to `audit_put_timeout` for the
+    flusher to make room and then drops the entry, so a slow database
+    slows requests down by a bounded amount instead of stalling them or
+    growing memory without limit. After `stop`, entries are written one
+    at a time instead of restarting the flusher
+    """
+
+    RETRIES = 3
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=settings.audit_queue_size)
+        self._batch_ready = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Task] = None
+        self._carry: List[AuditLog] = []
+        self._stopping = False
+        self._stopped = False
+        self.written = 0
+        self.dropped = 0
+
+    async def log(
+        self,
+        action: AuditAction,
+        description: str,
+        user_id: Optional[int] = None,
+        resource_type: Optional[str] = None,
+        resource_id: Optional[int] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        """
+        Queue an audit entry, or write it right away once stopped
+
+        Returns:
+            False if the entry was dropped because the queue stayed full
+            or, once stopped, could not be written
+        """
+        entry = AuditLog(
+            action=action,
+            description=description,
+            user_id=user_id,
+            resource_type=resource_type,
+            resource_id=resource_id,
+            ip_address=ip_address,
+            user_agent=user_agent,
+            metadata=metadata,
+            created_at=datetime.now(timezone.utc)
+        )
+
+        if self._stopped:
+            written = self.written
+            await self._write([entry])
+            return self.written > written
+
+        self.start()
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self._batch_ready.set()
+            try:
+                await asyncio.wait_for(self._queue.put(entry), settings.audit_put_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    logger.warning(f"Audit queue full, {self.dropped} entries dropped so far")
+                return False
+
+        if self._queue.qsize() >= settings.audit_batch_size:
+            self._batch_ready.set()
+        return True
+
+    def _drain(self, limit: int) -> List[AuditLog]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _write(self, batch: List[AuditLog]) -> None:
+        for attempt in range(self.RETRIES):
+            try:
+                await AuditLog.bulk_create(batch)
+                self.written += len(batch)
+                return
+            except Exception as e:
+                if attempt == self.RETRIES - 1:
+                    self.dropped += len(batch)
+                    logger.error(f"Failed to write {len(batch)} audit entries: {e}")
+                    return
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def _run(self) -> None:
+        # The flag backs up cancellation, which wait_for can swallow
+        while not self._stopping:
+            first = await self._queue.get()
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), settings.audit_flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                self._carry.append(first)
+                raise
+            if self._stopping:
+                self._carry.append(first)
+                return
+            self._batch_ready.clear()
+
+            batch = [first] + self._drain(settings.audit_batch_size - 1)
+            # Shielded so shutdown waits for an in-flight batch instead of
+            # cancelling it halfway
+            self._writing = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._writing)
+            self._writing = None
+
+            if self._queue.qsize() >= settings.audit_batch_size:
+                self._batch_ready.set()
+
+    def start(self) -> None:
+        self._stopped = False
+        if self._runner is None or self._runner.done():
+            self._stopping = False
+            self._runner = asyncio.create_task(self._run())
+
+    async def flush(self) -> None:
+        """Write everything queued so far"""
+        if self._writing is not None:
+            await self._writing
+        if self._carry:
+            batch, self._carry = self._carry, []
+            await self._write(batch)
+        while not self._queue.empty():
+            await self._write(self._drain(settings.audit_batch_size))
+
+    async def stop(self) -> None:
+        """Stop the flusher and write out the queue; call before closing the DB"""
+        self._stopping = True
+        self._stopped = True
+        self._batch_ready.set()
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        await self.flush()
+
+
+audit = AuditWriter()
@@ -0,0 +1,308 @@
+"""
+Monthly range partitioning of audit_logs on created_at (PostgreSQL)
+
+The table is converted once, by the partition_audit_logs aerich
+migration, into a partitioned parent with one child per month
+(audit_logs_pYYYYMM). Partitions for the current month and the next
+`audit_partitions_ahead` months are created ahead of time. With
+`audit_retention_months`, older partitions are detached, written to a
+gzipped JSON-lines file in `audit_archive_dir` and dropped.
+
+Maintenance runs in one transaction under a transaction-level advisory
+lock, so of several workers starting at once only one creates partitions
+and the others skip that round. Retiring a partition
+happens after that, under a lock of its own: the detach, which blocks
+writes to audit_logs, commits on its own before the slow export, and the
+export and drop only touch the detached table.
+
+There is no default partition: every insert is stamped with the current
+time, which always has a partition, and a default partition would block
+creating partitions for months it holds rows of
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import re
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional, List, Tuple, AsyncIterator
+
+from loguru import logger
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from app.config import settings
+from app.models import AuditLog
+
+TABLE = AuditLog._meta.db_table
+PARTITION_RE = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+LOCK_NAME = f"{TABLE}:partitions"
+
+Month = Tuple[int, int]
+
+
+def month_of(at: datetime) -> Month:
+    return at.year, at.month
+
+
+def add_months(month: Month, n: int) -> Month:
+    index = month[0] * 12 + month[1] - 1 + n
+    return index // 12, index % 12 + 1
+
+
+def partition_name(month: Month) -> str:
+    return f"{TABLE}_p{month[0]:04d}{month[1]:02d}"
+
+
+def month_start(month: Month) -> str:
+    return f"{month[0]:04d}-{month[1]:02d}-01 00:00:00+00"
+
+
+class AuditPartitions:
+    """
+    Creates, retires and archives audit_logs partitions
+
+    A no-op unless the DB is PostgreSQL and audit_logs is partitioned,
+    i.e. not with generated schemas
+    """
+
+    INTERVAL = 6 * 3600
+    ARCHIVE_CHUNK = 5000
+
+    def __init__(self):
+        self._runner: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _conn():
+        return Tortoise.get_connection("default")
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn().capabilities.dialect == "postgres"
+
+    @asynccontextmanager
+    async def _locked(
+        self,
+        wait: bool = False,
+        name: str = LOCK_NAME
+    ) -> AsyncIterator[Optional[object]]:
+        """
+        Transaction holding an advisory lock, the maintenance lock by default
+
+        Yields:
+            The transaction connection, or None if another worker holds
+            the lock and `wait` is False
+        """
+        async with in_transaction() as conn:
+            if wait:
+                await conn.execute_query(
+                    "SELECT pg_advisory_xact_lock(hashtext($1))", [name]
+                )
+                yield conn
+                return
+
+            rows = await conn.execute_query_dict(
+                "SELECT pg_try_advisory_xact_lock(hashtext($1)) AS locked", [name]
+            )
+            yield conn if rows[0]["locked"] else None
+
+    async def is_partitioned(self, conn=None) -> bool:
+        rows = await (conn or self._conn()).execute_query_dict(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = $1::regclass",
+            [TABLE]
+        )
+        return bool(rows)
+
+    async def partitions(self, conn=None) -> List[Month]:
+        """
+        Months that have a partition table, oldest first
+
+        Includes partitions detached by an archive run that did not finish
+        """
+        rows = await (conn or self._conn()).execute_query_dict(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND relname ~ $1",
+            [PARTITION_RE.pattern.replace("(", "").replace(")", "")]
+        )
+        months = []
+        for row in rows:
+            match = PARTITION_RE.match(row["relname"])
+            if match:
+                months.append((int(match.group(1)), int(match.group(2))))
+        return sorted(months)
+
+    @staticmethod
+    def _create_sql(month: Month) -> str:
+        return (
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+            f"PARTITION OF {TABLE} FOR VALUES FROM ('{month_start(month)}') "
+            f"TO ('{month_start(add_months(month, 1))}')"
+        )
+
+    async def ensure_partitions(self, conn) -> None:
+        """Create partitions for this month and the months ahead"""
+        now = month_of(datetime.now(timezone.utc))
+        existing = set(await self.partitions(conn))
+
+        for n in range(settings.audit_partitions_ahead + 1):
+            month = add_months(now, n)
+            if month not in existing:
+                await conn.execute_script(self._create_sql(month))
+                logger.info(f"Created partition {partition_name(month)}")
+
+    @staticmethod
+    def _write_chunk(path: str, rows: List[dict]) -> None:
+        # Appending gzip members keeps the file a valid gzip stream
+        with gzip.open(path, "at", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, default=str) + "\n")
+
+    @staticmethod
+    async def _exists(conn, name: str) -> bool:
+        rows = await conn.execute_query_dict("SELECT to_regclass($1) AS rel", [name])
+        return rows[0]["rel"] is not None
+
+    async def detach(self, month: Month, wait: bool = True) -> bool:
+        """
+        Detach a partition in a short transaction of its own
+
+        DETACH PARTITION locks audit_logs exclusively, so nothing else
+        runs in that transaction
+
+        Returns:
+            False if another worker holds the partition's lock and `wait`
+            is False
+        """
+        name = partition_name(month)
+        async with self._locked(wait, f"{LOCK_NAME}:{name}") as conn:
+            if conn is None:
+                return False
+            if not await self._exists(conn, name):
+                return True
+
+            attached = await conn.execute_query_dict(
+                "SELECT 1 FROM pg_inherits WHERE inhrelid = $1::regclass", [name]
+            )
+            if attached:
+                await conn.execute_script(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+        return True
+
+    async def archive(self, month: Month, wait: bool = True) -> str:
+        """
+        Detach a partition, archive its rows and drop it
+
+        The export and drop run after the detach has committed, under the
+        partition's own advisory lock, so audit inserts are only blocked
+        for the detach itself
+
+        Returns:
+            Path of the archive file, "" if there was nothing to archive or,
+            with `wait` False, another worker is archiving it
+        """
+        if not await self.detach(month, wait):
+            return ""
+
+        name = partition_name(month)
+        async with self._locked(wait, f"{LOCK_NAME}:{name}") as conn:
+            # Another worker may have archived it while we waited for the lock
+            if conn is None or not await self._exists(conn, name):
+                return ""
+
+            os.makedirs(settings.audit_archive_dir, exist_ok=True)
+            path = os.path.join(settings.audit_archive_dir, f"{name}.jsonl.gz")
+            partial = path + ".partial"
+            if os.path.exists(partial):
+                os.remove(partial)
+
+            last_id, count = 0, 0
+            while True:
+                rows = await conn.execute_query_dict(
+                    f"SELECT * FROM {name} WHERE id > $1 ORDER BY id LIMIT {self.ARCHIVE_CHUNK}",
+                    [last_id]
+                )
+                if not rows:
+                    break
+                await asyncio.to_thread(self._write_chunk, partial, rows)
+                last_id = rows[-1]["id"]
+                count += len(rows)
+
+            if count:
+                os.replace(partial, path)
+            await conn.execute_script(f"DROP TABLE {name}")
+
+        logger.info(f"Archived {count} audit entries from {name} to {path}")
+        return path if count else ""
+
+    async def expired(self, conn=None) -> List[Month]:
+        """Months with a partition older than `audit_retention_months`"""
+        if not settings.audit_retention_months:
+            return []
+
+        cutoff = add_months(
+            month_of(datetime.now(timezone.utc)), -settings.audit_retention_months + 1
+        )
+        return [month for month in await self.partitions(conn) if month < cutoff]
+
+    async def apply_retention(self) -> List[str]:
+        """
+        Archive partitions older than `audit_retention_months`, skipping
+        any another worker is archiving
+
+        Returns:
+            Archive file paths written
+        """
+        paths = []
+        for month in await self.expired():
+            path = await self.archive(month, wait=False)
+            if path:
+                paths.append(path)
+        return paths
+
+    async def maintain(self) -> bool:
+        """
+        Create partitions in one locked transaction, then retire old
+        partitions one at a time after it
+
+        Returns:
+            False if another worker holds the maintenance lock
+        """
+        if not self.enabled:
+            return True
+
+        async with self._locked() as conn:
+            if conn is None:
+                logger.debug("Audit partition maintenance running elsewhere, skipped")
+                return False
+            if not await self.is_partitioned(conn):
+                logger.debug(f"{TABLE} is not partitioned, maintenance skipped")
+                return True
+            await self.ensure_partitions(conn)
+
+        await self.apply_retention()
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.INTERVAL)
+            try:
+                await self.maintain()
+            except Exception as e:
+                logger.error(f"Audit partition maintenance failed: {e}")
+
+    async def start(self) -> None:
+        try:
+            await self.maintain()
+        except Exception as e:
+            logger.error(f"Audit partition maintenance failed: {e}")
+        if self.enabled and (self._runner is None or self._runner.done()):
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+
+
+audit_partitions = AuditPartitions()
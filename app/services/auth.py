@@ -2,24 +2,28 @@
 Auth service handler for Discord OAuth and JWT tokens
 """
 
-import httpx
+import uuid
 from abc import ABC
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any
 from jose import jwt, JWTError
+from tortoise import Tortoise
 from fastapi import HTTPException, status
 
 from app.config import settings
 from app.models import User
-from app.schemas import DiscordUser, DiscordTokenResponse
+from app.schemas import DiscordUser, DiscordTokenResponse, TokenResponse, UserResponse
+from app.services.discord_http import DiscordHTTP
+from app.services.revocation import revocations
 
 class AuthService(ABC):
     """
     Auth service for discord Oauth and session mgmt.
     """
 
-    DISCORD_API_URL = "https://discord.com/api/v10"
-    DISCORD_OAUTH_URL = "https://discord.com/api/oauth2"
+    # Relative to settings.discord_api_base, see DiscordHTTP
+    DISCORD_API_URL = "/v10"
+    DISCORD_OAUTH_URL = "/oauth2"
 
     @staticmethod
     async def exchange_code_for_token(code: str) -> DiscordTokenResponse:
@@ -33,28 +37,27 @@ class AuthService(ABC):
             DiscordTokenResponse
         """
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{AuthService.DISCORD_OAUTH_URL}/token",
-                data={
-                    "client_id": settings.discord_client_id,
-                    "client_secret": settings.discord_client_secret,
-                    "grant_type": "authorization_code",
-                    "code": code,
-                    "redirect_uri": settings.discord_redirect_uri,
-                },
-                headers={
-                    "Content-Type": "application/x-www-form-urlencoded"
-                }
-            )
+        response = await DiscordHTTP.get().post(
+            f"{AuthService.DISCORD_OAUTH_URL}/token",
+            data={
+                "client_id": settings.discord_client_id,
+                "client_secret": settings.discord_client_secret,
+                "grant_type": "authorization_code",
+                "code": code,
+                "redirect_uri": settings.discord_redirect_uri,
+            },
+            headers={
+                "Content-Type": "application/x-www-form-urlencoded"
+            }
+        )
 
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Failed to exchange code for token"
-                )
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Failed to exchange code for token"
+            )
 
-            return DiscordTokenResponse(**response.json())
+        return DiscordTokenResponse(**response.json())
 
     @staticmethod
     async def get_discord_user(access_token: str) -> DiscordUser:
@@ -67,27 +70,32 @@ class AuthService(ABC):
         Returns:
             DiscordUser
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{AuthService.DISCORD_API_URL}/users/@me",
-                headers={
-                    "Authorization": f"Bearer {access_token}"
-                }
+        response = await DiscordHTTP.get().get(
+            f"{AuthService.DISCORD_API_URL}/users/@me",
+            headers={
+                "Authorization": f"Bearer {access_token}"
+            }
+        )
+
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Failed to get discord user"
             )
 
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Failed to get discord user"
-                )
+        return DiscordUser(**response.json())
 
-            return DiscordUser(**response.json())
+    UPSERT_FIELDS = ("discord_username", "discord_avatar", "email", "is_admin", "last_login", "updated_at")
 
     @staticmethod
     async def create_or_update_user(d_user: DiscordUser) -> User:
         """
         Create or update user from discord information
 
+        A single INSERT ... ON CONFLICT (discord_id) DO UPDATE ... RETURNING,
+        so a login is one round trip and concurrent first logins of the
+        same account cannot race into a unique violation
+
         Args:
             d_user: discord user data
 
@@ -95,39 +103,75 @@ class AuthService(ABC):
             User
         """
 
-        user = await User.filter(
-            discord_id=d_user.id
-        ).first()
+        conn = Tortoise.get_connection("default")
+        now = datetime.now(timezone.utc)
+        values = {
+            "discord_id": d_user.id,
+            "discord_username": d_user.username,
+            "discord_avatar": d_user.avatar,
+            "email": d_user.email,
+            "is_admin": d_user.id in settings.admin_ids_list,
+            "is_active": True,
+            "is_banned": False,
+            "created_at": now,
+            "updated_at": now,
+            "last_login": now,
+        }
 
-        is_admin = user.id in settings.admin_ids_list
+        if conn.capabilities.dialect == "postgres":
+            params = [f"${i}" for i in range(1, len(values) + 1)]
+        else:
+            params = ["?"] * len(values)
+
+        rows = await conn.execute_query_dict(
+            f"INSERT INTO {User._meta.db_table} ({', '.join(values)}) "
+            f"VALUES ({', '.join(params)}) "
+            f"ON CONFLICT (discord_id) DO UPDATE SET "
+            + ", ".join(f"{f} = EXCLUDED.{f}" for f in AuthService.UPSERT_FIELDS)
+            + " RETURNING *",
+            list(values.values())
+        )
 
-        if user:
-            user.discord_username = d_user.username
-            user.discord_avatar = d_user.avatar
-            user.email = d_user.email
-            user.is_admin = is_admin
-            await user.update_last_login()
-            await user.save()
+        user = User._init_from_db(**rows[0])
+        created = user.created_at == now
 
-        else:
-            user = await User.create(
-                discord_id=d_user.id,
-                discord_username=d_user.username,
-                discord_avatar=d_user.avatar,
-                email=d_user.email,
-                is_admin=is_admin,
-                last_login=datetime.utcnow()
-            )
+        # Raw SQL skips model signals; fire post_save so caches keyed on
+        # the user (principals) see the update
+        await user._post_save(
+            None, created, None if created else list(AuthService.UPSERT_FIELDS)
+        )
 
         return user
 
+    @staticmethod
+    def _encode(user: User, token_type: str, expires_delta: timedelta) -> str:
+        """Sign a JWT of the given type for user"""
+
+        now = datetime.utcnow()
+
+        tencode = {
+            "sub": str(user.id),
+            "discord_id": user.discord_id,
+            "is_admin": user.is_admin,
+            "type": token_type,
+            "jti": uuid.uuid4().hex,
+            "iat": now,
+            "exp": now + expires_delta
+        }
+
+        return jwt.encode(
+            tencode,
+            settings.secret_key,
+            algorithm="HS256"
+        )
+
     @staticmethod
     def create_access_token(
         user: User,
         expires_delta: Optional[timedelta] = None
     ) -> str:
         """
-        Create JWT access token for user
+        Create short-lived JWT access token for user
 
         Args:
             user: User model
@@ -138,32 +182,50 @@ class AuthService(ABC):
         """
 
         if expires_delta is None:
-            expires_delta = timedelta(days=30)
+            expires_delta = timedelta(seconds=settings.auth_access_token_ttl)
 
-        expire = datetime.utcnow() + expires_delta
+        return AuthService._encode(user, "access", expires_delta)
 
-        tencode = {
-            "sub": str(user.id),
-            "discord_id": user.discord_id,
-            "is_admin": user.is_admin,
-            "exp": expire
-        }
+    @staticmethod
+    def create_refresh_token(user: User) -> str:
+        """
+        Create long-lived JWT refresh token for user
 
-        encoded = jwt.encode(
-            tencode,
-            settings.secret_key,
-            algorithm="HS256"
+        Returns:
+            JWT token string
+        """
+
+        return AuthService._encode(
+            user, "refresh", timedelta(seconds=settings.auth_refresh_token_ttl)
         )
 
-        return encoded
+    @staticmethod
+    def issue_tokens(user: User) -> TokenResponse:
+        """
+        Access and refresh token pair for a login
+
+        Returns:
+            TokenResponse
+        """
+
+        return TokenResponse(
+            access_token=AuthService.create_access_token(user),
+            expires_in=settings.auth_access_token_ttl,
+            refresh_token=AuthService.create_refresh_token(user),
+            user=UserResponse.model_validate(user)
+        )
 
     @staticmethod
-    def verify_token(token: str) -> Dict[str, Any]:
+    def verify_token(token: str, token_type: str = "access") -> Dict[str, Any]:
         """
         Verify and decode JWT token
 
+        Does not consult the revocation list, see `authenticate`
+
         Args:
             token: JWT token string
+            token_type: Expected token type; tokens issued before typed
+                tokens existed count as access tokens
 
         Returns:
             Decoded token payload
@@ -178,10 +240,97 @@ class AuthService(ABC):
                 settings.secret_key,
                 algorithms=["HS256"]
             )
-            return payload
         except JWTError:
+            payload = None
+
+        if payload is None or payload.get("type", "access") != token_type:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
-            )
\ No newline at end of file
+            )
+
+        return payload
+
+    @staticmethod
+    async def authenticate(token: str, token_type: str = "access") -> Dict[str, Any]:
+        """
+        Verify a token and check it has not been revoked
+
+        Never touches the DB; revocation checks are in memory unless the
+        local Bloom filter flags the token
+
+        Raises:
+            HTTPException: If token is invalid or revoked
+        """
+
+        payload = AuthService.verify_token(token, token_type)
+
+        if await revocations.check(payload):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        return payload
+
+    @staticmethod
+    async def refresh_tokens(refresh_token: str) -> TokenResponse:
+        """
+        Rotate a refresh token into a new token pair
+
+        The presented refresh token is revoked before anything else is
+        awaited, so each can be used once, by one request, on any worker
+
+        Raises:
+            HTTPException: If the token is invalid or revoked, or the user
+                is gone, banned or inactive
+        """
+
+        payload = AuthService.verify_token(refresh_token, "refresh")
+
+        if not await revocations.claim(payload):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        user = await User.get_or_none(id=int(payload["sub"]))
+        if user is None or user.is_banned or not user.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        return AuthService.issue_tokens(user)
+
+    @staticmethod
+    async def revoke_token(token: str) -> None:
+        """
+        Revoke a single access or refresh token, e.g. on logout
+
+        Invalid or expired tokens are ignored
+        """
+
+        try:
+            payload = jwt.decode(token, settings.secret_key, algorithms=["HS256"])
+        except JWTError:
+            return
+
+        if payload.get("jti"):
+            await revocations.revoke(payload["jti"], float(payload["exp"]))
+
+    @staticmethod
+    async def set_banned(user: User, banned: bool = True) -> None:
+        """
+        Ban or unban a user; a ban revokes every token issued so far
+        """
+
+        user.is_banned = banned
+        await user.save(update_fields=["is_banned"])
+
+        if banned:
+            await revocations.revoke_user(user.id)
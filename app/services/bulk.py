@@ -0,0 +1,177 @@
+"""
+Concurrent bulk VM lifecycle operations for maintenance windows
+"""
+
+import asyncio
+import time
+from abc import ABC
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, AsyncIterator, Tuple
+
+from app.config import settings
+from app.models import VirtualMachine
+from app.models.vm import VMStatus
+from app.schemas import VMBulkAction, VMBulkProgress
+from app.services.proxmox import ProxmoxService
+
+
+class NodeRateLimiter:
+    """Spaces calls to each node at most `rate` per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next: Dict[str, float] = {}
+
+    async def acquire(self, node: str) -> None:
+        now = time.monotonic()
+        slot = max(now, self._next.get(node, now))
+        self._next[node] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class BulkVMOperations(ABC):
+    """
+    Fan a lifecycle action out over many VMs
+
+    Calls are bounded by a concurrency limit and a per-node rate limit,
+    each UPID is followed to completion by the shared task watcher, and
+    VirtualMachine.status is written back in batched UPDATEs
+    """
+
+    # action -> (ProxmoxService method, resulting status)
+    ACTIONS: Dict[str, Tuple[str, VMStatus]] = {
+        "start": ("start_vm", VMStatus.RUNNING),
+        "stop": ("stop_vm", VMStatus.STOPPED),
+        "restart": ("restart_vm", VMStatus.RUNNING),
+        "suspend": ("suspend_vm", VMStatus.SUSPENDED),
+        "delete": ("delete_vm", VMStatus.DELETED),
+    }
+
+    FLUSH_SIZE = 50
+
+    def __init__(self, proxmox: ProxmoxService):
+        self.proxmox = proxmox
+
+    @staticmethod
+    async def select(request: VMBulkAction) -> List[VirtualMachine]:
+        """
+        Resolve the vmid list or filter to VM rows
+
+        Raises:
+            ValueError: If neither is given, which would select every VM
+        """
+        if not request.vmids and not request.has_filter:
+            raise ValueError("Bulk action needs vmids or a filter")
+
+        query = VirtualMachine.filter(vmid__isnull=False)
+
+        if request.vmids is not None:
+            query = query.filter(vmid__in=request.vmids)
+        if request.owner_id is not None:
+            query = query.filter(owner_id=request.owner_id)
+        if request.node is not None:
+            query = query.filter(node=request.node)
+        if request.status is not None:
+            query = query.filter(status=request.status)
+
+        return await query.exclude(status=VMStatus.DELETED)
+
+    async def _apply(
+        self,
+        vm: VirtualMachine,
+        action: str,
+        semaphore: asyncio.Semaphore,
+        limiter: NodeRateLimiter
+    ) -> Tuple[VirtualMachine, Optional[str]]:
+        """
+        Run one action to completion
+
+        Returns:
+            (vm, error message or None)
+        """
+        method, _ = self.ACTIONS[action]
+
+        # Wait for the node's slot before taking a concurrency slot, so a
+        # rate-limited node does not hold slots other nodes could use
+        await limiter.acquire(vm.node)
+        async with semaphore:
+            try:
+                upid = await getattr(self.proxmox, method)(vm.vmid, node=vm.node)
+            except Exception as e:
+                return vm, str(e)
+
+            if upid and not await self.proxmox.wait_for_task(
+                upid, timeout=settings.proxmox_bulk_task_timeout
+            ):
+                return vm, f"Task {upid} did not finish OK"
+
+        return vm, None
+
+    @staticmethod
+    async def _flush(action: str, vms: List[VirtualMachine]) -> None:
+        """Write the new status for all successful VMs in one UPDATE"""
+        if not vms:
+            return
+
+        status = BulkVMOperations.ACTIONS[action][1]
+        fields = {"status": status, "status_message": None}
+        now = datetime.now(timezone.utc)
+        if status == VMStatus.RUNNING:
+            fields["started_at"] = now
+        elif status in (VMStatus.STOPPED, VMStatus.DELETED):
+            fields["stopped_at"] = now
+
+        await VirtualMachine.filter(
+            id__in=[vm.id for vm in vms]
+        ).update(**fields)
+
+    async def run(self, request: VMBulkAction) -> AsyncIterator[VMBulkProgress]:
+        """
+        Execute a bulk action, yielding progress as each VM finishes
+
+        Returns:
+            Async iterator of VMBulkProgress events
+        """
+        vms = await self.select(request)
+        total = len(vms)
+
+        semaphore = asyncio.Semaphore(
+            request.concurrency or settings.proxmox_bulk_concurrency
+        )
+        limiter = NodeRateLimiter(settings.proxmox_bulk_node_rate)
+        tasks = [
+            asyncio.create_task(self._apply(vm, request.action, semaphore, limiter))
+            for vm in vms
+        ]
+
+        pending: List[VirtualMachine] = []
+        done = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                vm, error = await finished
+                done += 1
+
+                if error is None:
+                    pending.append(vm)
+                    if len(pending) >= self.FLUSH_SIZE:
+                        await self._flush(request.action, pending)
+                        pending = []
+
+                yield VMBulkProgress(
+                    vmid=vm.vmid,
+                    action=request.action,
+                    success=error is None,
+                    error=error,
+                    done=done,
+                    total=total
+                )
+        finally:
+            for task in tasks:
+                task.cancel()
+            await self._flush(request.action, pending)
+
+    async def stream(self, request: VMBulkAction) -> AsyncIterator[str]:
+        """Progress as newline-delimited JSON, for a StreamingResponse"""
+        async for progress in self.run(request):
+            yield progress.model_dump_json() + "\n"
@@ -0,0 +1,101 @@
+"""
+Cached snapshot of Proxmox cluster resources
+
+One cluster/resources call fills node, storage and VM usage for the
+whole cluster
+"""
+
+import asyncio
+import time
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Tuple
+
+RequestFunc = Callable[..., Awaitable[Any]]
+
+
+class ClusterSnapshot:
+    """
+    Node, storage and VM usage from a single cluster/resources sweep
+    """
+
+    def __init__(self, request: RequestFunc, ttl: float = 10.0):
+        """
+        Args:
+            request: Coroutine `(method, path, **params)` calling the Proxmox API
+            ttl: Seconds a sweep is reused before refreshing
+        """
+        self._request = request
+        self.ttl = ttl
+
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.storages: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.vms: Dict[int, Dict[str, Any]] = {}
+        self.fetched_at: float = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+
+    @property
+    def age(self) -> float:
+        """Seconds since the last sweep"""
+        if not self.fetched_at:
+            return float("inf")
+        return time.monotonic() - self.fetched_at
+
+    @property
+    def fresh(self) -> bool:
+        return self.age < self.ttl
+
+    def load(self, resources: List[Dict[str, Any]], age: float = 0.0) -> None:
+        """
+        Replace the snapshot with a cluster/resources result
+
+        Args:
+            resources: cluster/resources entries
+            age: How old the result already is, e.g. when read from a shared cache
+        """
+        nodes, storages, vms = {}, {}, {}
+
+        for res in resources:
+            kind = res.get("type")
+            if kind == "node":
+                nodes[res["node"]] = res
+            elif kind == "storage":
+                storages[(res["node"], res["storage"])] = res
+            elif kind == "qemu" and not res.get("template"):
+                vms[int(res["vmid"])] = res
+
+        self.nodes, self.storages, self.vms = nodes, storages, vms
+        self.fetched_at = time.monotonic() - age
+
+    async def refresh(self, force: bool = False) -> None:
+        """
+        Refresh from cluster/resources unless the snapshot is still fresh
+
+        Concurrent callers share a single upstream request, and all of
+        them get its error at once if it fails
+        """
+        if not force and self.fresh:
+            return
+
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._sweep())
+            # Retrieved here too, in case every waiter was cancelled
+            self._inflight.add_done_callback(
+                lambda f: f.cancelled() or f.exception()
+            )
+        await asyncio.shield(self._inflight)
+
+    async def _sweep(self) -> None:
+        # Timestamp the sweep by when it was requested, not when it returned
+        started = time.monotonic()
+        resources = await self._request("get", "cluster/resources") or []
+        self.load(resources, age=time.monotonic() - started)
+
+    def node_of(self, vmid: int) -> Optional[str]:
+        """Node a VM was last seen on"""
+        vm = self.vms.get(vmid)
+        return vm.get("node") if vm else None
+
+    def online_nodes(self) -> List[Dict[str, Any]]:
+        return [n for n in self.nodes.values() if n.get("status") == "online"]
+
+    def storage(self, node: str, name: str) -> Optional[Dict[str, Any]]:
+        return self.storages.get((node, name))
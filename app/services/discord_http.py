@@ -0,0 +1,57 @@
+"""
+Process-wide pooled HTTP client for the Discord API
+"""
+
+from abc import ABC
+from typing import Optional
+
+import httpx
+from loguru import logger
+
+from app.config import settings
+
+
+class DiscordHTTP(ABC):
+    """
+    Shared keep-alive client for Discord OAuth and user lookups
+
+    Opened and closed by the app lifespan; used outside of it (scripts,
+    shells) the client is created lazily on first use
+    """
+
+    client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def open(cls) -> httpx.AsyncClient:
+        if cls.client is not None and not cls.client.is_closed:
+            return cls.client
+
+        http2 = settings.discord_http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("h2 is not installed, Discord client falls back to HTTP/1.1")
+                http2 = False
+
+        cls.client = httpx.AsyncClient(
+            base_url=settings.discord_api_base,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.discord_max_connections,
+                max_keepalive_connections=settings.discord_max_keepalive,
+                keepalive_expiry=settings.discord_keepalive_expiry
+            ),
+            timeout=httpx.Timeout(settings.discord_timeout, connect=5.0)
+        )
+        return cls.client
+
+    @classmethod
+    def get(cls) -> httpx.AsyncClient:
+        return cls.open()
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls.client is not None:
+            await cls.client.aclose()
+            cls.client = None
@@ -0,0 +1,243 @@
+"""
+In-process VM inventory cache fed by periodic cluster/resources sweeps
+
+Optionally shares sweeps between workers through Redis so only one
+worker hits Proxmox per refresh interval
+"""
+
+import asyncio
+import json
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+from loguru import logger
+
+from app.config import settings
+from app.services.cluster import ClusterSnapshot
+
+
+class InventoryCache:
+    """
+    VM status and config cache with per-entry TTLs and invalidation
+
+    Entries returned to callers carry `cache_age` (seconds since the data
+    was fetched) and `stale` (True when served past its TTL because
+    Proxmox could not be reached)
+    """
+
+    REDIS_KEY = "proxmox:inventory"
+    REDIS_LOCK = "proxmox:inventory:lock"
+
+    def __init__(self, cluster: ClusterSnapshot):
+        self.cluster = cluster
+        self.refresh_interval = settings.proxmox_inventory_refresh
+        self.ttl = settings.proxmox_inventory_ttl
+        self.config_ttl = settings.proxmox_config_ttl
+
+        self._entries: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+        self._configs: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+        self._invalidated: Dict[int, float] = {}
+        self._synced_at: float = 0.0
+        self._failed_at: float = 0.0
+        self._runner: Optional[asyncio.Task] = None
+        self._redis = None
+
+        if settings.proxmox_inventory_redis:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(settings.redis_url)
+
+    def _sync(self) -> None:
+        """Merge the latest cluster sweep into the entries"""
+        swept_at = self.cluster.fetched_at
+        if swept_at <= self._synced_at:
+            return
+
+        for vmid, vm in self.cluster.vms.items():
+            # A sweep that started before our own start/stop must not
+            # overwrite the invalidation with pre-action state
+            if self._invalidated.get(vmid, 0) >= swept_at:
+                continue
+            current = self._entries.get(vmid)
+            if current is None or current[0] < swept_at:
+                self._entries[vmid] = (swept_at, vm)
+
+        for vmid in set(self._entries) - set(self.cluster.vms):
+            if self._entries[vmid][0] < swept_at:
+                del self._entries[vmid]
+
+        self._invalidated = {
+            vmid: at for vmid, at in self._invalidated.items() if at >= swept_at
+        }
+        self._synced_at = swept_at
+
+    @staticmethod
+    def _annotate(fetched_at: float, data: Dict[str, Any], stale: bool = False) -> Dict[str, Any]:
+        return {
+            **data,
+            "cache_age": round(time.monotonic() - fetched_at, 3),
+            "stale": stale
+        }
+
+    async def refresh(self) -> None:
+        """
+        Refresh the cluster sweep, reusing a sibling worker's sweep from
+        Redis when it is recent enough
+        """
+        if self._redis is None:
+            await self.cluster.refresh(force=True)
+            return
+
+        try:
+            shared = await self._redis.get(self.REDIS_KEY)
+            if shared:
+                blob = json.loads(shared)
+                age = max(time.time() - blob["at"], 0.0)
+                if age < self.refresh_interval:
+                    self.cluster.load(blob["resources"], age=age)
+                    return
+
+            locked = await self._redis.set(
+                self.REDIS_LOCK, 1, nx=True, px=int(self.refresh_interval * 1000)
+            )
+            if not locked and shared:
+                self.cluster.load(blob["resources"], age=age)
+                return
+        except Exception as e:
+            logger.warning(f"Inventory Redis read failed: {e}")
+
+        await self.cluster.refresh(force=True)
+
+        try:
+            resources = (
+                list(self.cluster.nodes.values())
+                + list(self.cluster.storages.values())
+                + list(self.cluster.vms.values())
+            )
+            await self._redis.set(
+                self.REDIS_KEY,
+                json.dumps({"at": time.time(), "resources": resources}),
+                ex=max(int(self.ttl), 1)
+            )
+        except Exception as e:
+            logger.warning(f"Inventory Redis write failed: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+                self._failed_at = 0.0
+            except Exception as e:
+                logger.warning(f"Inventory sweep failed: {e}")
+                self._failed_at = time.monotonic()
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        """Start the background sweep loop"""
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    async def _ensure_fresh(self) -> bool:
+        """
+        Refresh the sweep if it is past its TTL
+
+        After a failed refresh, callers get the cached entries without
+        going upstream again until `proxmox_inventory_refresh` has passed
+
+        Returns:
+            False if Proxmox could not be reached and entries may be stale
+        """
+        self.start()
+        reachable = True
+        if self.cluster.age >= self.ttl:
+            if time.monotonic() - self._failed_at < self.refresh_interval:
+                reachable = False
+            else:
+                try:
+                    await self.refresh()
+                    self._failed_at = 0.0
+                except Exception as e:
+                    logger.warning(f"Inventory refresh failed, serving cached entries: {e}")
+                    self._failed_at = time.monotonic()
+                    reachable = False
+        self._sync()
+        return reachable
+
+    def _expired(self, entry: Tuple[float, Dict[str, Any]]) -> bool:
+        return time.monotonic() - entry[0] >= self.ttl
+
+    async def get(self, vmid: int) -> Optional[Dict[str, Any]]:
+        """
+        Cached status of a VM
+
+        Returns:
+            Annotated status within its TTL, the last known status flagged
+            `stale` if Proxmox could not be reached, else None
+        """
+        reachable = await self._ensure_fresh()
+
+        entry = self._entries.get(vmid)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            return None if reachable else self._annotate(*entry, stale=True)
+        return self._annotate(*entry)
+
+    def get_stale(self, vmid: int) -> Optional[Dict[str, Any]]:
+        """Last known status regardless of TTL, flagged as stale"""
+        entry = self._entries.get(vmid)
+        if entry is None:
+            return None
+        return self._annotate(*entry, stale=True)
+
+    def put(self, vmid: int, status: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a live status and return it annotated"""
+        previous = self._entries.get(vmid)
+        data = {**previous[1], **status} if previous else dict(status)
+        entry = (time.monotonic(), data)
+        self._entries[vmid] = entry
+        return self._annotate(*entry)
+
+    async def list(self, node: Optional[str] = None) -> List[Dict[str, Any]]:
+        """All cached VMs, optionally limited to one node"""
+        await self._ensure_fresh()
+
+        return [
+            self._annotate(*entry, stale=self._expired(entry))
+            for entry in self._entries.values()
+            if node is None or entry[1].get("node") == node
+        ]
+
+    def get_config(self, vmid: int) -> Optional[Dict[str, Any]]:
+        entry = self._configs.get(vmid)
+        if entry is None or time.monotonic() - entry[0] >= self.config_ttl:
+            return None
+        return self._annotate(*entry)
+
+    def put_config(self, vmid: int, config: Dict[str, Any]) -> Dict[str, Any]:
+        entry = (time.monotonic(), dict(config))
+        self._configs[vmid] = entry
+        return self._annotate(*entry)
+
+    def invalidate(self, vmid: int) -> None:
+        """
+        Drop cached status and config once one of our own actions on a VM
+        has succeeded
+
+        Other workers pick up the change on their next sweep; the shared
+        Redis sweep is dropped so that sweep goes upstream
+        """
+        self._entries.pop(vmid, None)
+        self._configs.pop(vmid, None)
+        self._invalidated[vmid] = time.monotonic()
+
+        if self._redis is not None:
+            task = asyncio.ensure_future(self._redis.delete(self.REDIS_KEY))
+            task.add_done_callback(lambda t: t.exception())
@@ -0,0 +1,133 @@
+"""
+Parallel VM IP discovery via the QEMU guest agent with a UniFi fallback
+"""
+
+import asyncio
+import re
+import time
+from abc import ABC
+from typing import Optional, Dict, Iterable
+
+from loguru import logger
+
+from app.config import settings
+from app.models import VirtualMachine
+from app.services.proxmox import ProxmoxService
+from app.services.unifi import UnifiService
+
+MAC_RE = re.compile(r"([0-9A-Fa-f]{2}(?::[0-9A-Fa-f]{2}){5})")
+
+
+class IPResolver(ABC):
+    """
+    Resolves IPs for many booting VMs at once
+
+    Each round asks every pending guest agent concurrently, then matches
+    the rest by MAC against one bulk client listing from the UniFi
+    controller, backing off between rounds. Results are cached in
+    VirtualMachine.ip_address
+    """
+
+    def __init__(self, proxmox: ProxmoxService, unifi: Optional[UnifiService] = None):
+        self.proxmox = proxmox
+        self.unifi = unifi
+        self._semaphore = asyncio.Semaphore(settings.ip_resolve_concurrency)
+
+    async def _mac(self, vm: VirtualMachine) -> Optional[str]:
+        """MAC address of the VM's first NIC from its config"""
+        try:
+            config = await self.proxmox.get_vm_config(vm.vmid, node=vm.node)
+        except Exception:
+            return None
+
+        match = MAC_RE.search(config.get("net0", ""))
+        return match.group(1).lower() if match else None
+
+    async def _agent_ip(self, vm: VirtualMachine) -> Optional[str]:
+        async with self._semaphore:
+            return await self.proxmox.get_vm_ip(vm.vmid, node=vm.node)
+
+    async def _lease_ips(self, macs: Dict[int, Optional[str]]) -> Dict[int, str]:
+        """Match pending VMs by MAC against the controller's client list"""
+        if self.unifi is None or not any(macs.values()):
+            return {}
+
+        by_mac = {
+            c.get("mac", "").lower(): c.get("ip") or c.get("last_ip")
+            for c in await self.unifi.list_clients()
+        }
+        return {
+            vm_id: by_mac[mac]
+            for vm_id, mac in macs.items()
+            if mac and by_mac.get(mac)
+        }
+
+    async def resolve_many(
+        self,
+        vms: Iterable[VirtualMachine],
+        timeout: Optional[float] = None,
+        refresh: bool = False
+    ) -> Dict[int, str]:
+        """
+        Resolve and store IPs for VMs
+
+        Args:
+            vms: VM rows with a vmid
+            timeout: Give up on VMs still unresolved after this many seconds
+            refresh: Ignore IPs already stored on the rows
+
+        Returns:
+            Mapping of VirtualMachine.id to IP for every resolved VM
+        """
+        vms = [vm for vm in vms if vm.vmid is not None]
+        resolved = {
+            vm.id: vm.ip_address
+            for vm in vms
+            if vm.ip_address and not refresh
+        }
+        pending = {vm.id: vm for vm in vms if vm.id not in resolved}
+        if not pending:
+            return resolved
+
+        macs = dict(zip(
+            pending,
+            await asyncio.gather(*(self._mac(vm) for vm in pending.values()))
+        ))
+
+        deadline = time.monotonic() + (timeout or settings.ip_resolve_timeout)
+        delay = 1.0
+        found: Dict[int, str] = {}
+
+        while pending:
+            ips = await asyncio.gather(*(self._agent_ip(vm) for vm in pending.values()))
+            found.update({vm_id: ip for vm_id, ip in zip(pending, ips) if ip})
+
+            remaining = {vm_id: macs.get(vm_id) for vm_id in pending if vm_id not in found}
+            try:
+                found.update(await self._lease_ips(remaining))
+            except Exception as e:
+                logger.warning(f"UniFi lease lookup failed: {e}")
+
+            pending = {vm_id: vm for vm_id, vm in pending.items() if vm_id not in found}
+            if not pending or time.monotonic() + delay > deadline:
+                break
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 10.0)
+
+        if found:
+            rows = [vm for vm in vms if vm.id in found]
+            for vm in rows:
+                vm.ip_address = found[vm.id]
+            await VirtualMachine.bulk_update(rows, fields=["ip_address"])
+
+        return {**resolved, **found}
+
+    async def resolve(
+        self,
+        vm: VirtualMachine,
+        timeout: Optional[float] = None,
+        refresh: bool = False
+    ) -> Optional[str]:
+        """Resolve and store the IP of a single VM"""
+        return (await self.resolve_many([vm], timeout, refresh)).get(vm.id)
@@ -0,0 +1,143 @@
+"""
+Keyset (cursor) pagination over (created_at, id), newest first
+
+Pages are fetched with WHERE (created_at, id) < cursor instead of OFFSET,
+so every page costs the same regardless of depth, and no COUNT(*) runs
+unless a total is asked for
+"""
+
+import base64
+import json
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple, Callable, TypeVar
+
+from fastapi import HTTPException, status
+from tortoise import Tortoise
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+from app.config import settings
+from app.schemas import CursorPage
+
+T = TypeVar("T")
+
+MAX_PAGE_SIZE = 100
+MAX_COUNTS = 1024
+
+# Count cache: sql -> (at, total), oldest first
+_counts: Dict[str, Tuple[float, int]] = {}
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Raises:
+        HTTPException: 400 for malformed cursors
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+async def estimate_count(queryset: QuerySet) -> int:
+    """Planner row estimate for a query (PostgreSQL), exact count elsewhere"""
+    conn = Tortoise.get_connection("default")
+    if conn.capabilities.dialect != "postgres":
+        return await queryset.count()
+
+    _, rows = await conn.execute_query(
+        f"EXPLAIN (FORMAT JSON) {queryset.sql(params_inline=True)}"
+    )
+    plan = rows[0]["QUERY PLAN"]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def cached_count(queryset: QuerySet) -> int:
+    """Exact count, reused for `pagination_count_ttl` seconds per query"""
+    key = queryset.sql(params_inline=True)
+    hit = _counts.get(key)
+    now = time.monotonic()
+    if hit is not None and now - hit[0] < settings.pagination_count_ttl:
+        return hit[1]
+
+    total = await queryset.count()
+    _counts.pop(key, None)
+    _counts[key] = (now, total)
+    if len(_counts) > MAX_COUNTS:
+        for stale in [k for k, (at, _) in _counts.items() if now - at >= settings.pagination_count_ttl]:
+            del _counts[stale]
+        while len(_counts) > MAX_COUNTS:
+            del _counts[next(iter(_counts))]
+    return total
+
+
+async def paginate(
+    queryset: QuerySet,
+    page_size: int = 50,
+    cursor: Optional[str] = None,
+    total: Optional[str] = None,
+    serialize: Callable[[Any], T] = lambda row: row
+) -> CursorPage[T]:
+    """
+    One page of a queryset in (created_at, id) descending order
+
+    Args:
+        queryset: Filtered queryset of a model with created_at and id
+        page_size: Items per page
+        cursor: next_cursor of the previous page
+        total: None to skip counting, "estimate" for the planner
+            estimate, "cached" for an exact count cached briefly
+        serialize: Applied to each row, e.g. `lambda vm: vm.to_dict()`
+
+    Returns:
+        CursorPage
+
+    Raises:
+        HTTPException: 400 for a bad page size or cursor
+    """
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"page_size must be between 1 and {MAX_PAGE_SIZE}"
+        )
+
+    base = queryset
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=id)
+        )
+
+    rows: List[Any] = await queryset.order_by("-created_at", "-id").limit(page_size + 1)
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    count = None
+    if total == "estimate":
+        count = await estimate_count(base)
+    elif total == "cached":
+        count = await cached_count(base)
+
+    return CursorPage.create(
+        items=[serialize(row) for row in rows],
+        page_size=page_size,
+        next_cursor=next_cursor,
+        total=count,
+        total_is_estimate=total == "estimate"
+    )
@@ -0,0 +1,342 @@
+"""
+Free-list allocator for external SSH ports
+
+Ports in `vps_ssh_port_range_start`..`vps_ssh_port_range_end` move between
+three states: free, leased (reserved by an in-flight provision) and used
+(stored on a VirtualMachine or PortForward row). Leases expire, so a
+provision that crashes before committing gives its port back.
+
+With `vps_port_allocator_redis` the free set and leases live in Redis
+and are shared by every worker; otherwise each process keeps its own and
+the unique constraints remain the cross-worker guard
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Optional, Dict, Set, Iterable, Deque
+
+from loguru import logger
+
+from app.config import settings
+from app.models import VirtualMachine, PortForward
+
+FREE, LEASED, USED = 0, 1, 2
+
+RESERVE_SCRIPT = """
+local port = redis.call('SPOP', KEYS[1])
+if port then redis.call('ZADD', KEYS[2], ARGV[1], port) end
+return port
+"""
+
+CLAIM_SCRIPT = """
+if redis.call('SREM', KEYS[1], ARGV[2]) == 1 then
+    redis.call('ZADD', KEYS[2], ARGV[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class PortExhaustedError(Exception):
+    """Raised when no port in the range is free"""
+
+
+class PortAllocator:
+    """
+    O(1) reserve/commit/release over the SSH port range
+
+    Usage:
+        port = await allocator.reserve()
+        ... create the VM or port forward row with `port` ...
+        await allocator.commit(port)
+
+    and `release(port)` when the row is deleted or the provision fails
+    """
+
+    REDIS_FREE = "ports:ssh:free"
+    REDIS_LEASES = "ports:ssh:leases"
+    REDIS_RANGE = "ports:ssh:range"
+    REDIS_LOCK = "ports:ssh:lock"
+
+    REAP_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        lease_ttl: Optional[int] = None
+    ):
+        self.start = start if start is not None else settings.vps_ssh_port_range_start
+        self.end = end if end is not None else settings.vps_ssh_port_range_end
+        self.lease_ttl = lease_ttl or settings.vps_port_lease_ttl
+
+        self._state = bytearray(self.end - self.start + 1)
+        self._free: Deque[int] = deque()
+        # 1 while a port sits in `_free`, so it is never queued twice
+        self._queued = bytearray(self.end - self.start + 1)
+        self._leases: Dict[int, float] = {}
+        self._loaded = False
+        self._runner: Optional[asyncio.Task] = None
+        self._redis = None
+
+        if settings.vps_port_allocator_redis:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(settings.redis_url, decode_responses=True)
+            self._reserve_script = self._redis.register_script(RESERVE_SCRIPT)
+            self._claim_script = self._redis.register_script(CLAIM_SCRIPT)
+
+    @property
+    def signature(self) -> str:
+        return f"{self.start}-{self.end}"
+
+    def in_range(self, port: int) -> bool:
+        return self.start <= port <= self.end
+
+    async def _used_ports(self, ports: Optional[Iterable[int]] = None) -> Set[int]:
+        """Ports in the range held by DB rows, optionally limited to `ports`"""
+        vms = VirtualMachine.filter(ssh_port__gte=self.start, ssh_port__lte=self.end)
+        forwards = PortForward.filter(external_port__gte=self.start, external_port__lte=self.end)
+        if ports is not None:
+            ports = list(ports)
+            vms = vms.filter(ssh_port__in=ports)
+            forwards = forwards.filter(external_port__in=ports)
+
+        vm_ports, forward_ports = await asyncio.gather(
+            vms.values_list("ssh_port", flat=True),
+            forwards.values_list("external_port", flat=True)
+        )
+        return set(vm_ports) | set(forward_ports)
+
+    async def load(self, force: bool = False) -> None:
+        """
+        Build the free list from the DB
+
+        In Redis mode the shared set is only rebuilt when missing, when
+        the configured range changed, or when forced; outstanding leases
+        are kept
+        """
+        used = await self._used_ports()
+
+        if self._redis is None:
+            self._state = bytearray(self.end - self.start + 1)
+            for port in used:
+                self._state[port - self.start] = USED
+            for port in self._leases:
+                self._state[port - self.start] = LEASED
+            self._free = deque(
+                port for port in range(self.start, self.end + 1)
+                if self._state[port - self.start] == FREE
+            )
+            self._queued = bytearray(
+                1 if state == FREE else 0 for state in self._state
+            )
+            self._loaded = True
+            logger.info(f"Port allocator loaded: {len(self._free)} free")
+            return
+
+        if not force and await self._redis.get(self.REDIS_RANGE) == self.signature:
+            self._loaded = True
+            return
+
+        while not await self._redis.set(self.REDIS_LOCK, 1, nx=True, ex=30):
+            # Another worker is rebuilding; wait for its set, or for the
+            # lock to free up if it died halfway
+            await asyncio.sleep(0.2)
+            if not force and await self._redis.get(self.REDIS_RANGE) == self.signature:
+                self._loaded = True
+                return
+
+        try:
+            leased = {int(p) for p in await self._redis.zrange(self.REDIS_LEASES, 0, -1)}
+            free = [
+                port for port in range(self.start, self.end + 1)
+                if port not in used and port not in leased
+            ]
+            pipe = self._redis.pipeline(transaction=True)
+            pipe.delete(self.REDIS_FREE)
+            for i in range(0, len(free), 5000):
+                pipe.sadd(self.REDIS_FREE, *free[i:i + 5000])
+            pipe.set(self.REDIS_RANGE, self.signature)
+            await pipe.execute()
+            logger.info(f"Port allocator loaded: {len(free)} free")
+        finally:
+            await self._redis.delete(self.REDIS_LOCK)
+
+        self._loaded = True
+
+    async def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            await self.load()
+
+    async def reserve(self, ttl: Optional[int] = None) -> int:
+        """
+        Lease any free port
+
+        Raises:
+            PortExhaustedError: The range is full
+        """
+        await self._ensure_loaded()
+        ttl = ttl or self.lease_ttl
+
+        if self._redis is not None:
+            port = await self._reserve_script(
+                keys=[self.REDIS_FREE, self.REDIS_LEASES],
+                args=[time.time() + ttl]
+            )
+            if port is None:
+                raise PortExhaustedError("No free SSH ports")
+            return int(port)
+
+        while self._free:
+            port = self._free.popleft()
+            self._queued[port - self.start] = 0
+            # Entries claimed directly stay in the deque and are skipped here
+            if self._state[port - self.start] == FREE:
+                self._state[port - self.start] = LEASED
+                self._leases[port] = time.monotonic() + ttl
+                return port
+
+        raise PortExhaustedError("No free SSH ports")
+
+    async def claim(self, port: int, ttl: Optional[int] = None) -> bool:
+        """
+        Lease a specific port, e.g. one requested for a port forward
+
+        Returns:
+            False if the port is outside the range or not free
+        """
+        if not self.in_range(port):
+            return False
+        await self._ensure_loaded()
+        ttl = ttl or self.lease_ttl
+
+        if self._redis is not None:
+            return bool(await self._claim_script(
+                keys=[self.REDIS_FREE, self.REDIS_LEASES],
+                args=[time.time() + ttl, port]
+            ))
+
+        if self._state[port - self.start] != FREE:
+            return False
+        self._state[port - self.start] = LEASED
+        self._leases[port] = time.monotonic() + ttl
+        return True
+
+    async def commit(self, port: int) -> None:
+        """Mark a leased port as used once its row is saved"""
+        if not self.in_range(port):
+            return
+
+        if self._redis is not None:
+            await self._redis.zrem(self.REDIS_LEASES, port)
+            return
+
+        self._leases.pop(port, None)
+        self._state[port - self.start] = USED
+
+    async def release(self, port: int) -> None:
+        """Return a leased or used port to the free list"""
+        if not self.in_range(port):
+            return
+
+        if self._redis is not None:
+            pipe = self._redis.pipeline(transaction=True)
+            pipe.zrem(self.REDIS_LEASES, port)
+            pipe.sadd(self.REDIS_FREE, port)
+            await pipe.execute()
+            return
+
+        self._leases.pop(port, None)
+        if self._state[port - self.start] != FREE:
+            self._state[port - self.start] = FREE
+            if not self._queued[port - self.start]:
+                self._queued[port - self.start] = 1
+                self._free.append(port)
+
+    async def reap(self) -> int:
+        """
+        Return expired leases to the free list
+
+        A port whose provision saved its row but died before `commit` is
+        marked used instead, so the DB stays the source of truth
+
+        Returns:
+            Number of ports freed
+        """
+        if self._redis is not None:
+            expired = [
+                int(p) for p in await self._redis.zrangebyscore(
+                    self.REDIS_LEASES, "-inf", time.time(), start=0, num=1000
+                )
+            ]
+        else:
+            now = time.monotonic()
+            expired = [port for port, at in self._leases.items() if at <= now]
+
+        if not expired:
+            return 0
+
+        used = await self._used_ports(expired)
+        freed = 0
+
+        if self._redis is not None:
+            pipe = self._redis.pipeline(transaction=False)
+            for port in expired:
+                pipe.zrem(self.REDIS_LEASES, port)
+            removed = await pipe.execute()
+
+            # Only the worker whose ZREM won returns the port
+            returned = [
+                port for port, won in zip(expired, removed)
+                if won and port not in used
+            ]
+            if returned:
+                await self._redis.sadd(self.REDIS_FREE, *returned)
+            freed = len(returned)
+        else:
+            for port in expired:
+                if port in used:
+                    await self.commit(port)
+                else:
+                    await self.release(port)
+                    freed += 1
+
+        if freed:
+            logger.info(f"Reclaimed {freed} expired SSH port leases")
+        return freed
+
+    async def free_count(self) -> int:
+        await self._ensure_loaded()
+        if self._redis is not None:
+            return await self._redis.scard(self.REDIS_FREE)
+        return self._state.count(FREE)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.warning(f"Port lease reaping failed: {e}")
+            await asyncio.sleep(self.REAP_INTERVAL)
+
+    async def start(self) -> None:
+        """Load from the DB and start reaping expired leases"""
+        try:
+            await self.load()
+        except Exception as e:
+            # Retried on first use by _ensure_loaded
+            logger.error(f"Port allocator load failed: {e}")
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        if self._redis is not None:
+            await self._redis.aclose()
+
+
+port_allocator = PortAllocator()
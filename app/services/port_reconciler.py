@@ -0,0 +1,226 @@
+"""
+Reconciles PortForward rows with the UniFi controller's rules
+"""
+
+import asyncio
+import time
+from abc import ABC
+from typing import Optional, Dict, Any, List, Tuple
+
+from loguru import logger
+
+from app.config import settings
+from app.models import PortForward
+from app.schemas import PortForwardSyncItem, PortForwardSyncReport
+from app.services.unifi import UnifiService, PROTOCOLS
+
+
+class PortForwardReconciler(ABC):
+    """
+    Computes and applies a create/update/delete plan from two bulk reads
+
+    Controller rules without a matching row are only deleted when their
+    name carries `unifi_rule_prefix`, so rules made by hand are left alone
+    """
+
+    RETRIES = 3
+
+    # plan op -> PortForwardSyncReport counter
+    COUNTERS = {
+        "create": "created",
+        "update": "updated",
+        "delete": "deleted",
+        "adopt": "adopted",
+    }
+
+    def __init__(self, unifi: UnifiService):
+        self.unifi = unifi
+
+    @staticmethod
+    def desired(pf: PortForward) -> Dict[str, Any]:
+        """Controller fields a row should produce"""
+        return {
+            "enabled": pf.is_active,
+            "dst_port": str(pf.external_port),
+            "fwd": pf.internal_ip,
+            "fwd_port": str(pf.internal_port),
+            "proto": PROTOCOLS.get(pf.protocol.lower(), "tcp"),
+        }
+
+    @classmethod
+    def diff(cls, pf: PortForward, rule: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            key: value
+            for key, value in cls.desired(pf).items()
+            if str(rule.get(key)).lower() != str(value).lower()
+        }
+
+    def plan(
+        self,
+        rows: List[PortForward],
+        rules: List[Dict[str, Any]]
+    ) -> List[Tuple[PortForwardSyncItem, Optional[PortForward]]]:
+        """
+        Build the reconciliation plan in memory
+
+        Returns:
+            (plan item, row it applies to) pairs
+        """
+        by_id = {r["_id"]: r for r in rules if r.get("_id")}
+        by_port = {
+            (int(r["dst_port"]), r["proto"]): r
+            for r in rules
+            if r.get("_id") and str(r.get("dst_port", "")).isdigit()
+        }
+
+        steps = []
+        claimed = set()
+
+        for pf in rows:
+            rule = by_id.get(pf.unifi_rule_id) if pf.unifi_rule_id else None
+
+            if rule is None:
+                proto = PROTOCOLS.get(pf.protocol.lower(), "tcp")
+                candidate = by_port.get((pf.external_port, proto))
+                if candidate is not None and candidate["_id"] not in claimed:
+                    rule = candidate
+                    steps.append((PortForwardSyncItem(
+                        op="adopt",
+                        port_forward_id=pf.id,
+                        rule_id=rule["_id"],
+                        external_port=pf.external_port
+                    ), pf))
+
+            if rule is None:
+                if pf.is_active:
+                    steps.append((PortForwardSyncItem(
+                        op="create",
+                        port_forward_id=pf.id,
+                        external_port=pf.external_port,
+                        changes=self.desired(pf)
+                    ), pf))
+                continue
+
+            claimed.add(rule["_id"])
+            changes = self.diff(pf, rule)
+            if changes:
+                steps.append((PortForwardSyncItem(
+                    op="update",
+                    port_forward_id=pf.id,
+                    rule_id=rule["_id"],
+                    external_port=pf.external_port,
+                    changes=changes
+                ), pf))
+
+        for rule in rules:
+            if rule.get("_id") in claimed:
+                continue
+            if rule.get("name", "").startswith(settings.unifi_rule_prefix):
+                steps.append((PortForwardSyncItem(
+                    op="delete",
+                    rule_id=rule["_id"],
+                    external_port=int(rule["dst_port"]) if str(rule.get("dst_port", "")).isdigit() else None
+                ), None))
+
+        return steps
+
+    async def _execute(
+        self,
+        item: PortForwardSyncItem,
+        pf: Optional[PortForward]
+    ) -> None:
+        """Apply one step against the controller"""
+        if item.op == "adopt":
+            pf.unifi_rule_id = item.rule_id
+
+        elif item.op == "create":
+            rule = await self.unifi.create_port_forward(
+                name=pf.rule_name,
+                external_port=pf.external_port,
+                internal_ip=pf.internal_ip,
+                internal_port=pf.internal_port,
+                protocol=pf.protocol,
+                enabled=pf.is_active
+            )
+            if not rule.get("_id"):
+                raise RuntimeError("Controller returned no rule")
+            pf.unifi_rule_id = rule["_id"]
+            item.rule_id = rule["_id"]
+
+        elif item.op == "update":
+            await self.unifi.update_port_forward(item.rule_id, **item.changes)
+
+        elif item.op == "delete":
+            if not await self.unifi.delete_port_forward(item.rule_id):
+                raise RuntimeError(f"Failed to delete rule {item.rule_id}")
+
+    async def _execute_with_retry(
+        self,
+        item: PortForwardSyncItem,
+        pf: Optional[PortForward],
+        semaphore: asyncio.Semaphore
+    ) -> bool:
+        async with semaphore:
+            for attempt in range(self.RETRIES):
+                try:
+                    await self._execute(item, pf)
+                    return True
+                except Exception as e:
+                    item.error = str(e)
+                    if attempt < self.RETRIES - 1:
+                        await asyncio.sleep(0.5 * 2 ** attempt)
+
+        logger.error(f"Port forward reconcile {item.op} failed: {item.error}")
+        return False
+
+    async def reconcile(self, dry_run: bool = False) -> PortForwardSyncReport:
+        """
+        Bring the controller in line with the PortForward table
+
+        Args:
+            dry_run: Only compute and return the plan
+
+        Returns:
+            PortForwardSyncReport
+
+        Raises:
+            Exception: If the controller listing fails; the run is aborted
+                rather than planned against an empty rule set
+        """
+        started = time.monotonic()
+
+        rows, rules = await asyncio.gather(
+            PortForward.all(),
+            self.unifi.fetch_port_forwards()
+        )
+        steps = self.plan(rows, rules)
+        report = PortForwardSyncReport(
+            dry_run=dry_run,
+            plan=[item for item, _ in steps]
+        )
+
+        if not dry_run:
+            semaphore = asyncio.Semaphore(settings.unifi_reconcile_concurrency)
+            results = await asyncio.gather(*(
+                self._execute_with_retry(item, pf, semaphore)
+                for item, pf in steps
+            ))
+
+            changed_rows = {}
+            for (item, pf), ok in zip(steps, results):
+                if not ok:
+                    report.failed += 1
+                    continue
+                item.error = None
+                counter = self.COUNTERS[item.op]
+                setattr(report, counter, getattr(report, counter) + 1)
+                if item.op in ("create", "adopt"):
+                    changed_rows[pf.id] = pf
+
+            if changed_rows:
+                await PortForward.bulk_update(
+                    list(changed_rows.values()), fields=["unifi_rule_id"]
+                )
+
+        report.duration = round(time.monotonic() - started, 3)
+        return report
@@ -0,0 +1,288 @@
+"""
+Cache of authenticated principals (decoded JWT claims + User) keyed by
+token hash, so authenticated requests skip the JWT decode and User query
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Optional, Dict, Any, Set, Tuple
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from loguru import logger
+from tortoise.signals import post_save, post_delete
+
+from app.config import settings
+from app.models import User
+from app.services.auth import AuthService
+from app.services.revocation import revocations
+
+
+class Principal:
+    """An authenticated caller"""
+
+    __slots__ = ("user", "claims")
+
+    def __init__(self, user: User, claims: Dict[str, Any]):
+        self.user = user
+        self.claims = claims
+
+
+class PrincipalCache:
+    """
+    Token hash -> Principal with a short TTL
+
+    Entries are dropped when their user is saved or deleted. Queryset
+    `.update()` bypasses model signals, so callers changing users that way
+    must call `invalidate_user`. With `auth_principal_redis`, principals
+    are shared between workers and invalidations are broadcast so every
+    worker evicts its local copy
+    """
+
+    REDIS_PREFIX = "auth:principal:"
+    REDIS_USER_PREFIX = "auth:principal:user:"
+    REDIS_CHANNEL = "auth:principal:invalidate"
+
+    # Past this many local entries, expired ones are swept and then the
+    # oldest dropped, so tokens never presented again do not pile up
+    MAX_ENTRIES = 10000
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = settings.auth_principal_ttl if ttl is None else ttl
+        self._entries: Dict[str, Tuple[float, Principal]] = {}
+        self._by_user: Dict[int, Set[str]] = {}
+        self._evictions: Dict[int, int] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._redis = None
+
+        if settings.auth_principal_redis:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(settings.redis_url)
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _expiry(self, claims: Dict[str, Any]) -> float:
+        """Local deadline: the TTL, but never past the token's own exp"""
+        deadline = time.monotonic() + self.ttl
+        exp = claims.get("exp")
+        if exp is not None:
+            deadline = min(deadline, time.monotonic() + float(exp) - time.time())
+        return deadline
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_user.get(entry[1].user.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[entry[1].user.id]
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (deadline, _) in self._entries.items() if deadline <= now]:
+            self._drop(key)
+
+        # Oldest first: dicts keep insertion order
+        excess = len(self._entries) - self.MAX_ENTRIES
+        for key in list(self._entries)[:max(excess, 0)]:
+            self._drop(key)
+
+    def _store(self, key: str, principal: Principal) -> None:
+        self._drop(key)
+        self._entries[key] = (self._expiry(principal.claims), principal)
+        self._by_user.setdefault(principal.user.id, set()).add(key)
+        if len(self._entries) > self.MAX_ENTRIES:
+            self._sweep()
+
+    def _evict(self, user_id: int) -> None:
+        self._evictions[user_id] = self._evictions.get(user_id, 0) + 1
+        for key in self._by_user.pop(user_id, ()):
+            self._entries.pop(key, None)
+
+    @staticmethod
+    def _dump_user(user: User) -> Dict[str, Any]:
+        return {
+            field: getattr(user, field)
+            for field in user._meta.db_fields
+        }
+
+    async def _redis_get(self, key: str) -> Optional[Principal]:
+        try:
+            blob = await self._redis.get(self.REDIS_PREFIX + key)
+        except Exception as e:
+            logger.warning(f"Principal cache Redis read failed: {e}")
+            return None
+        if not blob:
+            return None
+
+        data = json.loads(blob)
+        # The blob holds datetimes as strings, and drivers returning native
+        # types (asyncpg) get no conversion in _init_from_db
+        fields = User._meta.fields_map
+        row = {
+            name: fields[name].to_python_value(value)
+            for name, value in data["user"].items()
+        }
+        return Principal(User._init_from_db(**row), data["claims"])
+
+    async def _redis_put(self, key: str, principal: Principal) -> None:
+        ttl = int(max(self._expiry(principal.claims) - time.monotonic(), 0))
+        if not ttl:
+            return
+
+        blob = json.dumps(
+            {"user": self._dump_user(principal.user), "claims": principal.claims},
+            default=str
+        )
+        user_key = f"{self.REDIS_USER_PREFIX}{principal.user.id}"
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.set(self.REDIS_PREFIX + key, blob, ex=ttl)
+            pipe.sadd(user_key, key)
+            pipe.expire(user_key, ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Principal cache Redis write failed: {e}")
+
+    async def _unrevoked(self, key: str, principal: Principal) -> Principal:
+        """Re-check a cached principal against the revocation list"""
+        if await revocations.check(principal.claims):
+            self._drop(key)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return principal
+
+    async def resolve(self, token: str) -> Principal:
+        """
+        Principal for a bearer token
+
+        Raises:
+            HTTPException: 401 if the token is invalid or revoked, or its
+                user is gone
+        """
+        key = self.key(token)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                return await self._unrevoked(key, entry[1])
+            self._drop(key)
+
+        if self._redis is not None:
+            principal = await self._redis_get(key)
+            if principal is not None:
+                self._store(key, principal)
+                return await self._unrevoked(key, principal)
+
+        claims = await AuthService.authenticate(token)
+        user_id = int(claims.get("sub", 0))
+        # A ban landing while the row is read must not be cached over
+        evictions = self._evictions.get(user_id, 0)
+        user = await User.get_or_none(id=user_id)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        principal = Principal(user, claims)
+        if self.ttl and self._evictions.get(user_id, 0) == evictions:
+            self._store(key, principal)
+            if self._redis is not None:
+                await self._redis_put(key, principal)
+        return principal
+
+    async def invalidate_user(self, user_id: int) -> None:
+        """Forget every cached principal of a user, on all workers"""
+        self._evict(user_id)
+        if self._redis is None:
+            return
+
+        user_key = f"{self.REDIS_USER_PREFIX}{user_id}"
+        try:
+            keys = await self._redis.smembers(user_key)
+            pipe = self._redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.delete(self.REDIS_PREFIX + key.decode())
+            pipe.delete(user_key)
+            pipe.publish(self.REDIS_CHANNEL, user_id)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Principal cache Redis invalidation failed: {e}")
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.REDIS_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            self._evict(int(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Principal invalidation listener failed: {e}")
+                await asyncio.sleep(1)
+
+    def start(self) -> None:
+        """Follow invalidations from other workers"""
+        if self._redis is not None and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.aclose()
+
+
+principals = PrincipalCache()
+
+
+@post_save(User)
+async def _user_saved(sender, instance: User, created: bool, using_db, update_fields) -> None:
+    if not created:
+        await principals.invalidate_user(instance.id)
+
+
+@post_delete(User)
+async def _user_deleted(sender, instance: User, using_db) -> None:
+    await principals.invalidate_user(instance.id)
+
+
+bearer = HTTPBearer()
+
+
+async def current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer)
+) -> Principal:
+    """
+    FastAPI dependency resolving the caller from the bearer token
+
+    Raises:
+        HTTPException: 401 for bad tokens, 403 for banned or inactive users
+    """
+    principal = await principals.resolve(credentials.credentials)
+
+    if principal.user.is_banned or not principal.user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User is banned" if principal.user.is_banned else "User is inactive"
+        )
+    return principal
+
+
+async def current_user(principal: Principal = Depends(current_principal)) -> User:
+    return principal.user
@@ -4,42 +4,218 @@ Proxmox service for VM Management using proxmoxer
 
 import asyncio
 from abc import ABC
-from typing import Optional, Dict, Any, List
-from proxmoxer import ProxmoxAPI
-import urllib3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Set, TYPE_CHECKING
+from loguru import logger
 
 from app.config import settings
+from app.models.vm import CloneStrategy
+from app.schemas import CloneEstimate
+from app.services.proxmox_http import ProxmoxHTTPClient
+from app.services.proxmox_tasks import TaskWatcher
+from app.services.cluster import ClusterSnapshot
+from app.services.inventory import InventoryCache
+from app.services.scheduler import PlacementScheduler
+from app.services.warm_pool import WarmPool
 
-if not settings.proxmox_verify_ssl:
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+if TYPE_CHECKING:
+    from proxmoxer import ProxmoxAPI
 
 
 class ProxmoxService(ABC):
     """
-    Thread-safe async wrapper for proxmoxer
+    Async wrapper for the Proxmox API
+
+    Uses the native async client by default, or proxmoxer on a dedicated
+    bounded thread pool when `proxmox_transport` is "thread". Per-VM calls
+    go to the VM's node when given, else to the node it was last seen on
+    in the cluster snapshot, else to `proxmox_node`
+
+    Nothing connects at construction: both transports log in on the first
+    request, or ahead of it through `warmup`
     """
 
+    # Clones retried with a fresh nextid when another worker took the VMID
+    CLONE_VMID_ATTEMPTS = 5
+
     def __init__(self):
-        """Initialize Proxmox API connection"""
-        self.proxmox = ProxmoxAPI(
-            settings.proxmox_host,
-            user=settings.proxmox_user,
-            password=settings.proxmox_password,
-            verify_ssl=settings.proxmox_verify_ssl
-        )
+        """Initialize Proxmox API clients, without connecting"""
         self.node = settings.proxmox_node
+        self.http: Optional[ProxmoxHTTPClient] = None
+        self.proxmox: Optional["ProxmoxAPI"] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore = asyncio.Semaphore(settings.proxmox_max_concurrency)
+        self._vmid_lock = asyncio.Lock()
+        self._connect_lock = asyncio.Lock()
+        self._background: Set[asyncio.Task] = set()
+
+        if settings.proxmox_transport == "async":
+            self.http = ProxmoxHTTPClient(
+                settings.proxmox_host,
+                user=settings.proxmox_user,
+                password=settings.proxmox_password,
+                verify_ssl=settings.proxmox_verify_ssl,
+                max_connections=settings.proxmox_max_concurrency,
+                timeout=settings.proxmox_timeout
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.proxmox_max_concurrency,
+                thread_name_prefix="proxmox"
+            )
+
+        self.tasks = TaskWatcher(self._request)
+        self.cluster = ClusterSnapshot(self._request, settings.proxmox_cluster_cache_ttl)
+        self.scheduler = PlacementScheduler(self.cluster)
+        self.inventory = InventoryCache(self.cluster)
+        self.warm_pool = WarmPool(self)
 
     async def _run_sync(self, func, *args, **kwargs):
-        """Run synchronous Proxmox API call in threadpool"""
-        loop = asyncio.get_event_loop()
+        """Run synchronous Proxmox API call in the dedicated threadpool"""
+        loop = asyncio.get_running_loop()
         return await loop.run_in_executor(
-            None,
+            self._executor,
             lambda: func(*args, **kwargs)
         )
 
+    @staticmethod
+    def _connect() -> "ProxmoxAPI":
+        """Build the proxmoxer client, which logs in synchronously"""
+        from proxmoxer import ProxmoxAPI
+
+        if not settings.proxmox_verify_ssl:
+            import urllib3
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+        return ProxmoxAPI(
+            settings.proxmox_host,
+            user=settings.proxmox_user,
+            password=settings.proxmox_password,
+            verify_ssl=settings.proxmox_verify_ssl,
+            timeout=settings.proxmox_timeout
+        )
+
+    async def _api(self) -> "ProxmoxAPI":
+        """proxmoxer client, logged in on first use off the event loop"""
+        if self.proxmox is None:
+            async with self._connect_lock:
+                if self.proxmox is None:
+                    self.proxmox = await self._run_sync(self._connect)
+        return self.proxmox
+
+    async def warmup(self) -> bool:
+        """
+        Log in, load the cluster snapshot and fill the warm pool ahead of
+        the first request
+
+        Failures are logged, not raised; requests connect on their own
+
+        Returns:
+            True if Proxmox was reachable
+        """
+        try:
+            if self.http is not None:
+                await self.http.login()
+            else:
+                await self._api()
+            await self.cluster.refresh()
+            await self.warm_pool.load()
+            return True
+        except Exception as e:
+            logger.warning(f"Proxmox warmup failed, connecting on first use: {e}")
+            return False
+
+    async def _request(self, method: str, path: str, **params) -> Any:
+        """
+        Call a Proxmox API path through the configured transport
+
+        Args:
+            method: HTTP method (get, post, put, delete)
+            path: API path, e.g. nodes/pve/qemu/100/status/current
+            **params: Query parameters or form fields
+
+        Returns:
+            Response data
+        """
+        async with self._semaphore:
+            if self.http is not None:
+                return await self.http.request(method, path, **params)
+
+            api = await self._api()
+            return await self._run_sync(
+                getattr(api(path), method),
+                **params
+            )
+
+    def _vm_path(self, vmid: int, node: Optional[str] = None) -> str:
+        """API path of a VM on its node"""
+        node = node or self.cluster.node_of(vmid) or self.node
+        return f"nodes/{node}/qemu/{vmid}"
+
+    def _template_for(self, node: str) -> Tuple[int, str]:
+        """
+        Template to clone for a target node
+
+        Returns:
+            (template vmid, node the template lives on)
+        """
+        templates = settings.node_templates
+        if node in templates:
+            return templates[node], node
+        return settings.vps_template_id, self.node
+
+    async def close(self) -> None:
+        """Release pooled connections and worker threads"""
+        await self.warm_pool.close()
+        await self.tasks.stop()
+        await self.inventory.stop()
+        # Only our wait is cancelled; a running move_disk finishes in Proxmox
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        if self.http is not None:
+            await self.http.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
     async def get_next_vmid(self) -> int:
         """Get next available VMID from Proxmox"""
-        return await self._run_sync(self.proxmox.cluster.nextid.get)
+        return int(await self._request("get", "cluster/nextid"))
+
+    async def start_clone(
+        self,
+        vmid: int,
+        name: str,
+        template_id: Optional[int] = None,
+        strategy: Optional[CloneStrategy] = None,
+        node: Optional[str] = None
+    ) -> str:
+        """
+        Submit a clone of the template without waiting for it
+
+        Linked strategies create a copy-on-write clone, which requires
+        the template to be a Proxmox template on snapshot-capable storage.
+        Cloning onto another node than the template's needs shared storage
+        unless the node has its own template in `proxmox_node_templates`
+
+        Returns:
+            UPID of the clone task
+        """
+        target = node or self.node
+        if template_id:
+            source = self.node
+        else:
+            template_id, source = self._template_for(target)
+        strategy = strategy or CloneStrategy(settings.vps_clone_strategy)
+
+        return await self._request(
+            "post",
+            f"nodes/{source}/qemu/{template_id}/clone",
+            newid=vmid,
+            name=name,
+            full=int(strategy == CloneStrategy.FULL),
+            target=target if target != source else None
+        )
 
     async def clone_vm(
         self,
@@ -48,7 +224,9 @@ class ProxmoxService(ABC):
         template_id: Optional[int] = None,
         memory: Optional[int] = None,
         cores: Optional[int] = None,
-        disk: Optional[int] = None
+        disk: Optional[int] = None,
+        strategy: Optional[CloneStrategy] = None,
+        node: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Clone a VM from template
@@ -57,30 +235,196 @@ class ProxmoxService(ABC):
             Task ID and status
         """
 
-        template_id = template_id or settings.vps_template_id
+        result = await self.start_clone(vmid, name, template_id, strategy, node)
+        await self.finish_clone(
+            vmid, result, memory, cores, disk, strategy=strategy, node=node
+        )
+
+        return result
+
+    async def clone_next(
+        self,
+        name: str,
+        template_id: Optional[int] = None,
+        strategy: Optional[CloneStrategy] = None,
+        node: Optional[str] = None
+    ) -> Tuple[int, str]:
+        """
+        Allocate the next VMID and submit a clone into it
+
+        Allocation is serialized within the process so concurrent clones
+        are not handed the same nextid before Proxmox has reserved it.
+        Other workers can still race for it, so a clone rejected because
+        the VMID already exists is retried with a fresh one
+
+        Returns:
+            (vmid, UPID of the clone task)
+        """
+        async with self._vmid_lock:
+            for attempt in range(1, self.CLONE_VMID_ATTEMPTS + 1):
+                vmid = await self.get_next_vmid()
+                try:
+                    task = await self.start_clone(vmid, name, template_id, strategy, node)
+                except Exception as e:
+                    if "already exists" not in str(e) or attempt == self.CLONE_VMID_ATTEMPTS:
+                        raise
+                    logger.info(f"VMID {vmid} was taken by another worker, retrying")
+                    continue
+                return vmid, task
+
+    async def finish_clone(
+        self,
+        vmid: int,
+        task_id: str,
+        memory: Optional[int] = None,
+        cores: Optional[int] = None,
+        disk: Optional[int] = None,
+        timeout: int = 60,
+        strategy: Optional[CloneStrategy] = None,
+        node: Optional[str] = None
+    ) -> None:
+        """
+        Wait for a clone task, then apply the resource config
+
+        For linked_then_full the disk is moved off the template's base
+        image in the background once the VM is usable
+        """
+        strategy = strategy or CloneStrategy(settings.vps_clone_strategy)
         memory = memory or settings.vps_default_memory
         cores = cores or settings.vps_default_cores
 
-        result = await self._run_sync(
-            self.proxmox.nodes(self.node).qemu(template_id).clone.post,
-            newid=vmid,
-            name=name,
-            full=1
-        )
+        node = node or self.node
 
-        await self.wait_for_task(result)
+        await self.wait_for_task(task_id, timeout)
 
-        await self._run_sync(
-            self.proxmox.nodes(self.node).qemu(vmid).config.put,
+        await self._request(
+            "put",
+            f"{self._vm_path(vmid, node)}/config",
             memory=memory,
             cores=cores,
             onboot=0
         )
 
         if disk:
-            await self.resize_disk(vmid, disk)
+            await self.resize_disk(vmid, disk, node=node)
 
-        return result
+        if strategy == CloneStrategy.LINKED_THEN_FULL:
+            task = asyncio.create_task(self._migrate_to_full(vmid, node))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def _migrate_to_full(self, vmid: int, node: str) -> None:
+        """
+        Turn a linked clone into an independent copy by moving its disk
+
+        Proxmox refuses a move onto the storage the disk is already on, so
+        the clone stays linked when that is `proxmox_migrate_storage`
+        """
+        try:
+            config = await self._request("get", f"{self._vm_path(vmid, node)}/config")
+            current = str((config or {}).get("scsi0", "")).split(":", 1)[0]
+            if current == settings.proxmox_migrate_storage:
+                logger.warning(
+                    f"Linked clone {vmid} already on {current}; set "
+                    f"proxmox_migrate_storage to another storage to make it a full copy"
+                )
+                return
+
+            upid = await self._request(
+                "post",
+                f"{self._vm_path(vmid, node)}/move_disk",
+                disk="scsi0",
+                storage=settings.proxmox_migrate_storage,
+                delete=1
+            )
+            if not await self.wait_for_task(upid, timeout=3600):
+                logger.error(f"Full migrate of linked clone {vmid} failed")
+        except Exception as e:
+            logger.error(f"Full migrate of linked clone {vmid} failed: {e}")
+
+    @staticmethod
+    def estimate_clone(
+        strategy: CloneStrategy,
+        disk: Optional[int] = None
+    ) -> CloneEstimate:
+        """
+        Estimate storage and time cost of a clone strategy
+
+        Full copies are costed at `proxmox_clone_throughput` MB/s; linked
+        clones only allocate copy-on-write deltas up front
+
+        Returns:
+            CloneEstimate
+        """
+        disk = disk or settings.vps_default_disk
+        copy_seconds = disk * 1024 / settings.proxmox_clone_throughput
+        linked_seconds = settings.proxmox_linked_clone_seconds
+
+        if strategy == CloneStrategy.FULL:
+            return CloneEstimate(
+                strategy=strategy,
+                initial_storage_gb=disk,
+                final_storage_gb=disk,
+                ready_seconds=copy_seconds
+            )
+
+        if strategy == CloneStrategy.LINKED:
+            return CloneEstimate(
+                strategy=strategy,
+                initial_storage_gb=0,
+                final_storage_gb=0,
+                ready_seconds=linked_seconds
+            )
+
+        return CloneEstimate(
+            strategy=strategy,
+            initial_storage_gb=0,
+            final_storage_gb=disk,
+            ready_seconds=linked_seconds,
+            background_seconds=copy_seconds
+        )
+
+    def clone_estimates(self, disk: Optional[int] = None) -> List[CloneEstimate]:
+        """Estimate every clone strategy for a disk size"""
+        return [self.estimate_clone(s, disk) for s in CloneStrategy]
+
+    async def provision_vm(
+        self,
+        name: str,
+        memory: Optional[int] = None,
+        cores: Optional[int] = None,
+        disk: Optional[int] = None,
+        strategy: Optional[CloneStrategy] = None
+    ) -> Dict[str, Any]:
+        """
+        Provision a VM, taking it from the warm pool when one is ready
+
+        The pool is filled with the default clone strategy, so requests
+        for another strategy always clone. Misses are placed on a node
+        picked by the scheduler
+
+        Returns:
+            Dict with `vmid`, `node` and `warm` (True on a pool hit)
+        """
+        memory = memory or settings.vps_default_memory
+        cores = cores or settings.vps_default_cores
+        size = disk or settings.vps_default_disk
+        strategy = strategy or CloneStrategy(settings.vps_clone_strategy)
+
+        if strategy == CloneStrategy(settings.vps_clone_strategy):
+            pooled = await self.warm_pool.acquire(name, memory, cores, size)
+            if pooled is not None:
+                vmid, node = pooled
+                return {"vmid": vmid, "node": node, "warm": True}
+
+        node = await self.scheduler.pick_node(memory, cores, size)
+        vmid, task = await self.clone_next(name, strategy=strategy, node=node)
+        # Resized to the same size a pool hit has
+        await self.finish_clone(
+            vmid, task, memory, cores, size, strategy=strategy, node=node
+        )
+
+        return {"vmid": vmid, "node": node, "warm": False}
 
     async def create_vm(
         self,
@@ -88,7 +432,8 @@ class ProxmoxService(ABC):
         name: str,
         memory: int,
         cores: int,
-        disk: int
+        disk: int,
+        node: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Create a new VM
@@ -96,14 +441,15 @@ class ProxmoxService(ABC):
         Returns:
             Creation result
         """
-        return await self._run_sync(
-            self.proxmox.nodes(self.node).qemu.post,
+        return await self._request(
+            "post",
+            f"nodes/{node or self.node}/qemu",
             vmid=vmid,
             name=name,
             memory=memory,
             cores=cores,
             scsihw='virtio-scsi-pci',
-            scsi0=f'local-lvm:{disk}',
+            scsi0=f'{settings.proxmox_storage}:{disk}',
             net0='virtio,bridge=vmbr0',
             ostype='l26'
         )
@@ -111,14 +457,18 @@ class ProxmoxService(ABC):
     async def resize_disk(
         self,
         vmid: int,
-        size_gb: int
+        size_gb: int,
+        node: Optional[str] = None
     ) -> Dict[str, Any]:
         """Resize VM Disk"""
-        return await self._run_sync(
-            self.proxmox.nodes(self.node).qemu(vmid).resize.put,
+        result = await self._request(
+            "put",
+            f"{self._vm_path(vmid, node)}/resize",
             disk='scsi0',
             size=f"{size_gb}G"
         )
+        self.inventory.invalidate(vmid)
+        return result
 
     async def wait_for_task(
         self,
@@ -127,78 +477,123 @@ class ProxmoxService(ABC):
     ) -> bool:
         """
         Wait for Proxmox task to complete
-        """
-        for _ in range(timeout):
-            try:
-                status: Optional[Dict[str, Any]] = await self._run_sync(
-                    self.proxmox.nodes(self.node).tasks(task_id).status.get
-                )
 
-                if status.get('status') == 'stopped':
-                    return status.get('exitstatus') == "OK"
-
-                await asyncio.sleep(1)
-            except Exception:
-                return False
+        Completion is detected by the shared task watcher, which batches
+        all pending tasks into one cluster/tasks query per tick
+        """
+        return await self.tasks.wait(task_id, timeout)
 
-        return False
-    
-    async def start_vm(self, vmid: int) -> Dict[str, Any]:
+    async def start_vm(self, vmid: int, node: Optional[str] = None) -> Dict[str, Any]:
         """Start a VM"""
-        return await self._run_sync(
-            self.proxmox.nodes(self.node).qemu(vmid).status.start.post
+        result = await self._request(
+            "post", f"{self._vm_path(vmid, node)}/status/start"
         )
+        self.inventory.invalidate(vmid)
+        return result
 
-    async def stop_vm(self, vmid: int) -> Dict[str, Any]:
+    async def stop_vm(self, vmid: int, node: Optional[str] = None) -> Dict[str, Any]:
         """Stop a VM gracefully"""
-        return await self._run_sync(
-            self.proxmox.nodes(self.node).qemu(vmid).status.shutdown.post
+        result = await self._request(
+            "post", f"{self._vm_path(vmid, node)}/status/shutdown"
         )
+        self.inventory.invalidate(vmid)
+        return result
 
-    async def force_stop_vm(self, vmid: int) -> Dict[str, Any]:
+    async def force_stop_vm(self, vmid: int, node: Optional[str] = None) -> Dict[str, Any]:
         """Force stop a VM"""
-        return await self._run_sync(
-            self.proxmox.nodes(self.node).qemu(vmid).status.stop.post
+        result = await self._request(
+            "post", f"{self._vm_path(vmid, node)}/status/stop"
         )
+        self.inventory.invalidate(vmid)
+        return result
 
-    async def restart_vm(self, vmid: int) -> Dict[str, Any]:
+    async def restart_vm(self, vmid: int, node: Optional[str] = None) -> Dict[str, Any]:
         """Restart a VM"""
-        return await self._run_sync(
-            self.proxmox.nodes(self.node).qemu(vmid).status.reboot.post
+        result = await self._request(
+            "post", f"{self._vm_path(vmid, node)}/status/reboot"
         )
-    
-    async def delete_vm(self, vmid: int) -> Dict[str, Any]:
+        self.inventory.invalidate(vmid)
+        return result
+
+    async def delete_vm(self, vmid: int, node: Optional[str] = None) -> Dict[str, Any]:
         """Delete a VM"""
-        return await self._run_sync(
-            self.proxmox.nodes(self.node).qemu(vmid).delete
+        result = await self._request(
+            "delete", self._vm_path(vmid, node)
         )
+        self.inventory.invalidate(vmid)
+        return result
 
-    async def suspend_vm(self, vmid: int) -> Dict[str, Any]:
+    async def suspend_vm(self, vmid: int, node: Optional[str] = None) -> Dict[str, Any]:
         """Suspend a VM"""
-        return await self._run_sync(
-            self.proxmox.nodes(self.node).qemu(vmid).status.suspend.post
+        result = await self._request(
+            "post", f"{self._vm_path(vmid, node)}/status/suspend"
         )
+        self.inventory.invalidate(vmid)
+        return result
 
-    async def get_vm_status(self, vmid: int) -> Dict[str, Any]:
-        """Get VM Status"""
-        return await self._run_sync(
-            self.proxmox.nodes(self.node).qemu(vmid).status.current.get
-        )
+    async def get_vm_status(self, vmid: int, node: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get VM Status
+
+        Served from the inventory cache when fresh, otherwise fetched live.
+        If Proxmox is unreachable the last known status is returned with
+        `stale` set
+        """
+        cached = await self.inventory.get(vmid)
+        if cached is not None:
+            return cached
+
+        try:
+            status = await self._request(
+                "get", f"{self._vm_path(vmid, node)}/status/current"
+            )
+        except Exception:
+            stale = self.inventory.get_stale(vmid)
+            if stale is None:
+                raise
+            return stale
+
+        return self.inventory.put(vmid, status)
+
+    async def get_vm_config(
+        self,
+        vmid: int,
+        node: Optional[str] = None,
+        cached: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Get VM Config, cached for `proxmox_config_ttl` seconds
 
-    async def get_vm_config(self, vmid: int) -> Dict[str, Any]:
-        """Get VM Config"""
-        return await self._run_sync(
-            self.proxmox.nodes(self.node).qemu(vmid).config.get
+        Args:
+            cached: False to always read upstream, e.g. for a current
+                `digest` to pass to update_vm_config
+        """
+        if cached:
+            hit = self.inventory.get_config(vmid)
+            if hit is not None:
+                return hit
+
+        config = await self._request(
+            "get", f"{self._vm_path(vmid, node)}/config"
         )
+        return self.inventory.put_config(vmid, config)
 
-    async def update_vm_config(self, vmid: int, **config) -> Dict[str, Any]:
+    async def update_vm_config(
+        self,
+        vmid: int,
+        node: Optional[str] = None,
+        **config
+    ) -> Dict[str, Any]:
         """Update VM Config"""
-        return await self._run_sync(
-            self.proxmox.nodes(self.node).qemu(vmid).config.put,
+        result = await self._request(
+            "put",
+            f"{self._vm_path(vmid, node)}/config",
             **config
         )
+        self.inventory.invalidate(vmid)
+        return result
 
-    async def get_vm_ip(self, vmid: int) -> Optional[str]:
+    async def get_vm_ip(self, vmid: int, node: Optional[str] = None) -> Optional[str]:
         """
         Get VM IP address from QEMU agent
 
@@ -206,8 +601,9 @@ class ProxmoxService(ABC):
             IP address if present
         """
         try:
-            result: Optional[Dict[str, Any]] = await self._run_sync(
-                self.proxmox.nodes(self.node).qemu(vmid).agent('network-get-interfaces').get
+            result: Optional[Dict[str, Any]] = await self._request(
+                "get",
+                f"{self._vm_path(vmid, node)}/agent/network-get-interfaces"
             )
 
             for interface in result.get('result', []):
@@ -221,10 +617,36 @@ class ProxmoxService(ABC):
         except Exception:
             return None
 
-    async def list_vms(self) -> List[Dict[str, Any]]:
-        """List all VMs on the node"""
-        return await self._run_sync(
-            self.proxmox.nodes(self.node).qemu.get
-        )
+    async def get_vm_rrddata(
+        self,
+        vmid: int,
+        node: Optional[str] = None,
+        timeframe: str = "hour",
+        cf: str = "AVERAGE"
+    ) -> List[Dict[str, Any]]:
+        """
+        VM usage history from the node's RRD
+
+        Args:
+            timeframe: hour, day, week, month or year
+            cf: Consolidation function, AVERAGE or MAX
+
+        Returns:
+            One entry per RRD step, oldest first
+        """
+        return await self._request(
+            "get",
+            f"{self._vm_path(vmid, node)}/rrddata",
+            timeframe=timeframe,
+            cf=cf
+        ) or []
+
+    async def list_vms(self, node: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        List VMs on a node, or across the whole cluster when no node is given
+
+        Answered from the inventory cache's cluster/resources sweep
+        """
+        return await self.inventory.list(node)
 
 
@@ -0,0 +1,175 @@
+"""
+Async-native Proxmox VE API client using httpx
+
+Keeps a keep-alive connection pool open to the API and reuses the
+PVE auth ticket and CSRF token until they are close to expiry
+"""
+
+import asyncio
+import time
+from typing import Optional, Dict, Any
+
+import httpx
+
+
+class ProxmoxHTTPError(Exception):
+    """Raised when the Proxmox API returns a non-success response"""
+
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        self.message = message
+        super().__init__(f"{status_code}: {message}")
+
+
+class ProxmoxHTTPClient:
+    """
+    Minimal async client for the Proxmox VE JSON API
+    """
+
+    # PVE tickets are valid for 2 hours, renew well before that
+    TICKET_REFRESH_AFTER = 90 * 60
+
+    def __init__(
+        self,
+        host: str,
+        user: str,
+        password: str,
+        verify_ssl: bool = False,
+        max_connections: int = 16,
+        timeout: float = 30.0
+    ):
+        """
+        Args:
+            host: Proxmox host, optionally with a port (defaults to 8006)
+            user: API user including realm, e.g. root@pam
+            password: API user password
+            verify_ssl: Verify the API TLS certificate
+            max_connections: Size of the keep-alive connection pool
+            timeout: Per-request timeout in seconds
+        """
+        if ":" not in host:
+            host = f"{host}:8006"
+
+        self.base_url = f"https://{host}/api2/json"
+        self.user = user
+        self.password = password
+        self.verify_ssl = verify_ssl
+        self.max_connections = max_connections
+        self.timeout = timeout
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._ticket: Optional[str] = None
+        self._csrf: Optional[str] = None
+        self._ticket_at: float = 0.0
+        self._login_lock = asyncio.Lock()
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        """Create the pooled client on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                verify=self.verify_ssl,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    def _ticket_valid(self) -> bool:
+        return (
+            self._ticket is not None
+            and time.monotonic() - self._ticket_at < self.TICKET_REFRESH_AFTER
+        )
+
+    async def login(self) -> None:
+        """
+        Request a new auth ticket and CSRF token
+
+        Raises:
+            ProxmoxHTTPError: If authentication fails
+        """
+        client = self._ensure_client()
+        response = await client.post(
+            "/access/ticket",
+            data={"username": self.user, "password": self.password}
+        )
+
+        if response.status_code != 200:
+            raise ProxmoxHTTPError(response.status_code, "Authentication failed")
+
+        data = response.json()["data"]
+        self._ticket = data["ticket"]
+        self._csrf = data["CSRFPreventionToken"]
+        self._ticket_at = time.monotonic()
+
+    async def _ensure_ticket(self) -> None:
+        """Log in once for all concurrent callers when the ticket is missing or old"""
+        if self._ticket_valid():
+            return
+
+        async with self._login_lock:
+            if not self._ticket_valid():
+                await self.login()
+
+    @staticmethod
+    def _encode(params: Dict[str, Any]) -> Dict[str, Any]:
+        """Proxmox expects 0/1 for booleans and ignores nulls"""
+        return {
+            k: int(v) if isinstance(v, bool) else v
+            for k, v in params.items()
+            if v is not None
+        }
+
+    async def request(self, method: str, path: str, **params) -> Any:
+        """
+        Call an API path and return the `data` member of the response
+
+        Args:
+            method: HTTP method (get, post, put, delete)
+            path: API path relative to /api2/json, e.g. nodes/pve/qemu
+            **params: Query parameters or form fields
+
+        Returns:
+            Decoded `data` payload
+
+        Raises:
+            ProxmoxHTTPError: On a non-2xx response
+        """
+        client = self._ensure_client()
+        method = method.upper()
+        params = self._encode(params)
+
+        for attempt in range(2):
+            await self._ensure_ticket()
+
+            headers = {"Cookie": f"PVEAuthCookie={self._ticket}"}
+            if method != "GET":
+                headers["CSRFPreventionToken"] = self._csrf
+
+            if method in ("GET", "DELETE"):
+                response = await client.request(
+                    method, f"/{path}", params=params, headers=headers
+                )
+            else:
+                response = await client.request(
+                    method, f"/{path}", data=params, headers=headers
+                )
+
+            if response.status_code == 401 and attempt == 0:
+                self._ticket = None
+                continue
+
+            if response.status_code >= 400:
+                raise ProxmoxHTTPError(
+                    response.status_code, response.reason_phrase or response.text
+                )
+
+            return response.json().get("data")
+
+    async def close(self) -> None:
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
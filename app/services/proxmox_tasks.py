@@ -0,0 +1,203 @@
+"""
+Shared watcher for Proxmox task completion
+
+Follows many UPIDs at once with a single cluster/tasks query per tick
+and resolves a future per task when it stops
+"""
+
+import asyncio
+import time
+from typing import Optional, Dict, Any, Callable, Awaitable, List
+
+from loguru import logger
+
+RequestFunc = Callable[..., Awaitable[Any]]
+
+
+def upid_node(upid: str) -> str:
+    """Extract the node name from a UPID (UPID:node:pid:pstart:...)"""
+    return upid.split(":")[1]
+
+
+class TaskWatcher:
+    """
+    Batched, adaptive-backoff poller for Proxmox tasks
+    """
+
+    def __init__(
+        self,
+        request: RequestFunc,
+        min_interval: float = 0.25,
+        max_interval: float = 5.0,
+        backoff: float = 1.5,
+        fallback_after: int = 3
+    ):
+        """
+        Args:
+            request: Coroutine `(method, path, **params)` calling the Proxmox API
+            min_interval: Poll interval right after a task is registered
+            max_interval: Upper bound for the poll interval
+            backoff: Interval growth factor per tick with no new tasks
+            fallback_after: Ticks a UPID may be missing from cluster/tasks
+                before it is looked up directly on its node
+        """
+        self._request = request
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.fallback_after = fallback_after
+
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._missing: Dict[str, int] = {}
+        self._waiters: Dict[str, int] = {}
+        self._interval = min_interval
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        self._stopped = False
+        self.requests_sent = 0
+
+    def watch(self, upid: str) -> asyncio.Future:
+        """
+        Follow a task until it stops
+
+        Returns:
+            Future resolving to the final task entry (with `exitstatus`),
+            failed at once after `stop`
+        """
+        if self._stopped:
+            future = asyncio.get_running_loop().create_future()
+            future.set_exception(RuntimeError("Proxmox task watcher is stopped"))
+            future.exception()
+            return future
+
+        future = self._futures.get(upid)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            # Mark failures retrieved, so a task nobody awaits any more
+            # does not log "Future exception was never retrieved"
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._futures[upid] = future
+            self._missing[upid] = 0
+
+        self._interval = self.min_interval
+        self._wakeup.set()
+
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+        return future
+
+    async def wait(self, upid: str, timeout: float = 60) -> bool:
+        """
+        Wait for a task and report whether it finished with OK
+
+        Returns:
+            bool
+        """
+        future = self.watch(upid)
+        self._waiters[upid] = self._waiters.get(upid, 0) + 1
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return False
+        except Exception:
+            return False
+        finally:
+            self._unwait(upid, future)
+
+        return result.get("exitstatus") == "OK"
+
+    def _unwait(self, upid: str, future: asyncio.Future) -> None:
+        """Stop following a task once its last waiter gave up on it"""
+        left = self._waiters.get(upid, 1) - 1
+        if left > 0:
+            self._waiters[upid] = left
+            return
+
+        self._waiters.pop(upid, None)
+        if not future.done() and self._futures.get(upid) is future:
+            del self._futures[upid]
+            self._missing.pop(upid, None)
+            future.cancel()
+
+    def _resolve(self, upid: str, entry: Dict[str, Any]) -> None:
+        future = self._futures.pop(upid, None)
+        self._missing.pop(upid, None)
+        if future is not None and not future.done():
+            future.set_result(entry)
+
+    def _fail(self, upid: str, exc: Exception) -> None:
+        future = self._futures.pop(upid, None)
+        self._missing.pop(upid, None)
+        if future is not None and not future.done():
+            future.set_exception(exc)
+
+    async def _poll(self) -> None:
+        """Run one tick: a single cluster sweep plus direct lookups for stragglers"""
+        self.requests_sent += 1
+        tasks: List[Dict[str, Any]] = await self._request("get", "cluster/tasks") or []
+        by_upid = {t.get("upid"): t for t in tasks}
+
+        stragglers = []
+        for upid in list(self._futures):
+            entry = by_upid.get(upid)
+            if entry is None:
+                self._missing[upid] += 1
+                if self._missing[upid] >= self.fallback_after:
+                    stragglers.append(upid)
+                continue
+
+            self._missing[upid] = 0
+            if entry.get("endtime"):
+                self._resolve(upid, {**entry, "exitstatus": entry.get("status")})
+
+        for upid in stragglers:
+            self._missing[upid] = 0
+            self.requests_sent += 1
+            try:
+                status = await self._request(
+                    "get", f"nodes/{upid_node(upid)}/tasks/{upid}/status"
+                )
+            except Exception as e:
+                self._fail(upid, e)
+                continue
+
+            if status and status.get("status") == "stopped":
+                self._resolve(upid, status)
+
+    async def _run(self) -> None:
+        """Poll until nothing is being watched"""
+        while self._futures:
+            self._wakeup.clear()
+            started = time.monotonic()
+
+            try:
+                await self._poll()
+            except Exception as e:
+                logger.warning(f"Proxmox task sweep failed: {e}")
+
+            if not self._futures:
+                break
+
+            deadline = started + self._interval
+            self._interval = min(self._interval * self.backoff, self.max_interval)
+
+            # New tasks shorten the wait, but never below min_interval per sweep
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                self._wakeup.clear()
+                deadline = min(deadline, started + self.min_interval)
+
+    async def stop(self) -> None:
+        """Stop polling and fail every pending wait"""
+        self._stopped = True
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+
+        for upid in list(self._futures):
+            self._fail(upid, RuntimeError("Proxmox task watcher is stopped"))
@@ -0,0 +1,236 @@
+"""
+Revoked JWT tracking with an in-memory Bloom filter front
+
+Revoked token ids (jti) are kept in a Redis sorted set scored by the
+token's expiry, and per-user cutoffs ("everything issued before T", used
+for bans) in a Redis hash. Each worker mirrors the token ids into a local
+Bloom filter, so checking a token that was never revoked, the normal
+case, is a few hash probes with no I/O. Only Bloom hits are confirmed
+against the exact set.
+
+Without `auth_revocation_redis` the exact set lives in process memory
+and revocations only apply to the worker that made them
+"""
+
+import asyncio
+import hashlib
+import math
+import time
+from typing import Optional, Dict, Any, Iterable
+
+from loguru import logger
+
+from app.config import settings
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings"""
+
+    __slots__ = ("size", "hashes", "bits", "count")
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationList:
+    """
+    Revoked token ids and per-user cutoffs
+
+    Usage:
+        if await revocations.check(claims):
+            ... reject ...
+    """
+
+    REDIS_TOKENS = "auth:revoked"
+    REDIS_USERS = "auth:revoked:users"
+    REDIS_VERSION = "auth:revoked:version"
+
+    def __init__(self):
+        self.capacity = settings.auth_revocation_capacity
+        self.bloom = BloomFilter(self.capacity)
+        self._tokens: Dict[str, float] = {}
+        self._cutoffs: Dict[str, float] = {}
+        self._version: Optional[str] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._redis = None
+
+        if settings.auth_revocation_redis:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(settings.redis_url, decode_responses=True)
+
+    def _rebuild(self, jtis: Iterable[str]) -> None:
+        jtis = list(jtis)
+        bloom = BloomFilter(max(self.capacity, 2 * len(jtis)))
+        for jti in jtis:
+            bloom.add(jti)
+        self.bloom = bloom
+
+    def _cut_off(self, claims: Dict[str, Any]) -> bool:
+        cutoff = self._cutoffs.get(str(claims.get("sub")))
+        return cutoff is not None and float(claims.get("iat", 0)) <= cutoff
+
+    async def check(self, claims: Dict[str, Any]) -> bool:
+        """
+        True if the token was revoked, directly or by a user cutoff
+
+        Tokens without a jti (issued before revocation support) can only
+        be revoked through their user's cutoff
+        """
+        if self._cut_off(claims):
+            return True
+
+        jti = claims.get("jti")
+        if not jti or jti not in self.bloom:
+            return False
+
+        if self._redis is None:
+            return self._tokens.get(jti, 0) > time.time()
+
+        try:
+            score = await self._redis.zscore(self.REDIS_TOKENS, jti)
+        except Exception as e:
+            # Fail closed only for ids the filter flagged
+            logger.warning(f"Revocation lookup failed: {e}")
+            return True
+        return score is not None and score > time.time()
+
+    async def claim(self, claims: Dict[str, Any]) -> bool:
+        """
+        Revoke a token unless it is already revoked, as one atomic step;
+        used to make refresh tokens single-use
+
+        Checked against the exact set, never the Bloom filter, since the
+        filter only learns other workers' revocations on the next sync
+
+        Returns:
+            True if this call revoked the token, False if it was already
+            revoked, cut off, has no jti, or Redis could not be reached
+        """
+        jti = claims.get("jti")
+        if not jti or self._cut_off(claims):
+            return False
+        expires_at = float(claims["exp"])
+
+        if self._redis is None:
+            # No await between the check and the set
+            if self._tokens.get(jti, 0) > time.time():
+                return False
+            self._tokens[jti] = expires_at
+            self.bloom.add(jti)
+            return True
+
+        try:
+            pipe = self._redis.pipeline(transaction=True)
+            pipe.zadd(self.REDIS_TOKENS, {jti: expires_at}, nx=True)
+            pipe.incr(self.REDIS_VERSION)
+            added, _ = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Revocation claim failed: {e}")
+            return False
+
+        self.bloom.add(jti)
+        return bool(added)
+
+    async def revoke(self, jti: str, expires_at: float) -> None:
+        """Revoke one token until it would have expired anyway"""
+        self.bloom.add(jti)
+
+        if self._redis is None:
+            self._tokens[jti] = expires_at
+            return
+
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.zadd(self.REDIS_TOKENS, {jti: expires_at})
+        pipe.incr(self.REDIS_VERSION)
+        await pipe.execute()
+
+    async def revoke_user(self, user_id: int, at: Optional[float] = None) -> None:
+        """Revoke every token of a user issued up to `at` (default now)"""
+        cutoff = at if at is not None else time.time()
+        self._cutoffs[str(user_id)] = cutoff
+
+        if self._redis is None:
+            return
+
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.hset(self.REDIS_USERS, str(user_id), cutoff)
+        pipe.incr(self.REDIS_VERSION)
+        await pipe.execute()
+
+    async def sync(self) -> None:
+        """
+        Drop expired entries and, in Redis mode, mirror the shared state
+        when another worker changed it
+        """
+        now = time.time()
+        # Cutoffs older than the longest token lifetime can't match anything
+        horizon = now - settings.auth_refresh_token_ttl
+
+        if self._redis is None:
+            expired = [jti for jti, exp in self._tokens.items() if exp <= now]
+            for jti in expired:
+                del self._tokens[jti]
+            if expired:
+                self._rebuild(self._tokens)
+            self._cutoffs = {u: at for u, at in self._cutoffs.items() if at > horizon}
+            return
+
+        await self._redis.zremrangebyscore(self.REDIS_TOKENS, "-inf", now)
+        version = await self._redis.get(self.REDIS_VERSION)
+        if version == self._version:
+            return
+
+        jtis, cutoffs = await asyncio.gather(
+            self._redis.zrangebyscore(self.REDIS_TOKENS, now, "+inf"),
+            self._redis.hgetall(self.REDIS_USERS)
+        )
+        stale = [u for u, at in cutoffs.items() if float(at) <= horizon]
+        if stale:
+            await self._redis.hdel(self.REDIS_USERS, *stale)
+
+        self._rebuild(jtis)
+        self._cutoffs = {u: float(at) for u, at in cutoffs.items() if u not in stale}
+        self._version = version
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning(f"Revocation sync failed: {e}")
+            await asyncio.sleep(settings.auth_revocation_sync_interval)
+
+    async def start(self) -> None:
+        """Load the shared list and keep the local mirror current"""
+        await self.sync()
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        if self._redis is not None:
+            await self._redis.aclose()
+
+
+revocations = RevocationList()
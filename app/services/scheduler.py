@@ -0,0 +1,138 @@
+"""
+VM placement scheduler for multi-node Proxmox clusters
+"""
+
+import time
+from typing import Optional, Dict, List, Any, Set
+
+from app.config import settings
+from app.services.cluster import ClusterSnapshot
+
+
+class NoCapacityError(Exception):
+    """Raised when no node can fit a VM"""
+
+
+class PlacementScheduler:
+    """
+    Pick a node for a new VM from the cached cluster snapshot
+
+    `binpack` fills the busiest node that still fits, `spread` uses the
+    node with the most free memory. Memory is counted as committed, the
+    configured `maxmem` of every VM on the node whether it runs or not,
+    so stopped VMs such as the warm pool still take up their share
+    """
+
+    # Placements whose VM has not shown up in a sweep yet, so a burst of
+    # creates does not all land on the same node
+    RESERVATION_TTL = 120.0
+
+    def __init__(self, snapshot: ClusterSnapshot, policy: Optional[str] = None):
+        self.snapshot = snapshot
+        self.policy = policy or settings.proxmox_placement_policy
+        self._reserved: List[Dict[str, Any]] = []
+
+    def _vmids(self, node: str) -> Set[int]:
+        return {vmid for vmid, vm in self.snapshot.vms.items() if vm.get("node") == node}
+
+    def _pending(self, node: str) -> Dict[str, int]:
+        """
+        Reservations on a node still pending
+
+        A reservation is settled by the first VM the snapshot shows on
+        its node that was not there when it was made
+        """
+        now = time.monotonic()
+        vmids = self._vmids(node)
+        settled: Set[int] = set()
+        pending = []
+        for r in self._reserved:
+            if now - r["at"] >= self.RESERVATION_TTL:
+                continue
+            if r["node"] == node:
+                new = vmids - r["known"] - settled
+                if new:
+                    settled.add(min(new))
+                    continue
+            pending.append(r)
+        self._reserved = pending
+
+        mem = sum(r["memory"] for r in pending if r["node"] == node)
+        disk = sum(r["disk"] for r in pending if r["node"] == node)
+        return {"memory": mem, "disk": disk}
+
+    def _committed(self, node: str) -> int:
+        """Configured memory (bytes) of every VM on a node"""
+        return sum(
+            int(vm.get("maxmem", 0))
+            for vm in self.snapshot.vms.values()
+            if vm.get("node") == node
+        )
+
+    def _free(self, node: Dict[str, Any]) -> Optional[Dict[str, float]]:
+        """Uncommitted memory (bytes) and free storage (bytes) on a node after reservations"""
+        pending = self._pending(node["node"])
+
+        mem_free = node.get("maxmem", 0) - self._committed(node["node"]) - pending["memory"]
+
+        storage = self.snapshot.storage(node["node"], settings.proxmox_storage)
+        if storage is None:
+            return None
+        disk_free = storage.get("maxdisk", 0) - storage.get("disk", 0) - pending["disk"]
+
+        return {"memory": mem_free, "disk": disk_free}
+
+    async def pick_node(self, memory: int, cores: int, disk: int) -> str:
+        """
+        Choose a node for a VM
+
+        Args:
+            memory: Memory in MB
+            cores: CPU cores
+            disk: Disk size in GB
+
+        Returns:
+            Node name
+
+        Raises:
+            NoCapacityError: If no online node has room for the VM
+        """
+        await self.snapshot.refresh()
+
+        mem_bytes = memory * 1024 ** 2
+        disk_bytes = disk * 1024 ** 3
+        allowed = settings.proxmox_nodes_list
+
+        candidates = []
+        for node in self.snapshot.online_nodes():
+            if allowed and node["node"] not in allowed:
+                continue
+            if node.get("maxcpu", 0) < cores:
+                continue
+
+            free = self._free(node)
+            if free is None or free["memory"] < mem_bytes or free["disk"] < disk_bytes:
+                continue
+
+            mem_ratio = (free["memory"] - mem_bytes) / max(node.get("maxmem", 1), 1)
+            candidates.append((mem_ratio, node.get("cpu", 0.0), node["node"]))
+
+        if not candidates:
+            raise NoCapacityError(
+                f"No node can fit {memory}MB / {cores} cores / {disk}GB"
+            )
+
+        if self.policy == "binpack":
+            _, _, chosen = min(candidates, key=lambda c: (c[0], -c[1]))
+        else:
+            _, _, chosen = max(candidates, key=lambda c: (c[0], -c[1]))
+
+        self._reserved.append({
+            "node": chosen,
+            "memory": mem_bytes,
+            "disk": disk_bytes,
+            "known": self._vmids(chosen),
+            "at": time.monotonic()
+        })
+
+        return chosen
@@ -0,0 +1,156 @@
+"""
+Bulk JSON serialization straight from `.values_list()` rows
+
+Listings skip model instances, `to_dict()` and the pydantic_model_creator
+models: rows come back as tuples, are zipped into dicts with the same keys
+as `to_dict()`, and orjson encodes the list (datetimes and enums included)
+in one call
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+import orjson
+from fastapi.responses import Response
+from tortoise import models
+from tortoise.queryset import QuerySet
+
+from app.models import User, VirtualMachine, PortForward, AuditLog
+
+
+def _avatar_url(discord_id: str, discord_avatar: Optional[str]) -> Optional[str]:
+    if discord_avatar:
+        return f"https://cdn.discordapp.com/avatars/{discord_id}/{discord_avatar}.png"
+    return None
+
+
+class RowSerializer:
+    """
+    Output keys mapped to DB fields for one model
+
+    Args:
+        columns: (key, field) pairs in output order
+        derived: key -> (function, fields) for values computed from
+            other columns, e.g. User.avatar_url
+    """
+
+    def __init__(
+        self,
+        columns: List[Tuple[str, str]],
+        derived: Optional[Dict[str, Tuple[Callable[..., Any], Tuple[str, ...]]]] = None
+    ):
+        self.keys = [key for key, _ in columns]
+        self.fields = [field for _, field in columns]
+        self.derived = []
+
+        for key, (func, sources) in (derived or {}).items():
+            indexes = []
+            for source in sources:
+                if source not in self.fields:
+                    self.fields.append(source)
+                indexes.append(self.fields.index(source))
+            self.derived.append((key, func, indexes))
+
+    def to_rows(self, tuples: List[tuple]) -> List[Dict[str, Any]]:
+        keys = self.keys
+        if not self.derived:
+            return [dict(zip(keys, row)) for row in tuples]
+
+        rows = []
+        for row in tuples:
+            item = dict(zip(keys, row))
+            for key, func, indexes in self.derived:
+                item[key] = func(*(row[i] for i in indexes))
+            rows.append(item)
+        return rows
+
+    async def rows(self, queryset: QuerySet) -> List[Dict[str, Any]]:
+        return self.to_rows(await queryset.values_list(*self.fields))
+
+    async def dumps(self, queryset: QuerySet) -> bytes:
+        return orjson.dumps(await self.rows(queryset))
+
+
+SERIALIZERS: Dict[Type[models.Model], RowSerializer] = {
+    VirtualMachine: RowSerializer([
+        ("id", "id"),
+        ("vmid", "vmid"),
+        ("node", "node"),
+        ("name", "name"),
+        ("memory", "memory"),
+        ("cores", "cores"),
+        ("disk", "disk"),
+        ("ssh_port", "ssh_port"),
+        ("ip_address", "ip_address"),
+        ("status", "status"),
+        ("status_message", "status_message"),
+        ("owner_id", "owner_id"),
+        ("created_at", "created_at"),
+        ("updated_at", "updated_at"),
+        ("started_at", "started_at"),
+        ("stopped_at", "stopped_at"),
+    ]),
+    PortForward: RowSerializer([
+        ("id", "id"),
+        ("unifi_rule_id", "unifi_rule_id"),
+        ("external_port", "external_port"),
+        ("internal_port", "internal_port"),
+        ("internal_ip", "internal_ip"),
+        ("protocol", "protocol"),
+        ("description", "description"),
+        ("is_active", "is_active"),
+        ("vm_id", "virtual_machine_id"),
+        ("created_at", "created_at"),
+    ]),
+    AuditLog: RowSerializer([
+        ("id", "id"),
+        ("action", "action"),
+        ("description", "description"),
+        ("user_id", "user_id"),
+        ("resource_type", "resource_type"),
+        ("resource_id", "resource_id"),
+        ("ip_address", "ip_address"),
+        ("metadata", "metadata"),
+        ("created_at", "created_at"),
+    ]),
+    User: RowSerializer(
+        [
+            ("id", "id"),
+            ("discord_id", "discord_id"),
+            ("username", "discord_username"),
+            ("email", "email"),
+            ("is_admin", "is_admin"),
+            ("is_active", "is_active"),
+            ("created_at", "created_at"),
+            ("last_login", "last_login"),
+        ],
+        derived={"avatar_url": (_avatar_url, ("discord_id", "discord_avatar"))}
+    ),
+}
+
+
+async def serialize_rows(queryset: QuerySet) -> List[Dict[str, Any]]:
+    """Rows of a queryset as plain dicts with the model's `to_dict()` keys"""
+    return await SERIALIZERS[queryset.model].rows(queryset)
+
+
+async def dump_rows(queryset: QuerySet) -> bytes:
+    """A queryset as a JSON array, encoded in one orjson call"""
+    return await SERIALIZERS[queryset.model].dumps(queryset)
+
+
+class RowsResponse(Response):
+    """
+    JSON response for bulk listings
+
+    Takes bytes from `dump_rows` as-is, or encodes any other content
+    (e.g. a CursorPage dump built from `serialize_rows`) with orjson:
+
+        return RowsResponse(await dump_rows(VirtualMachine.filter(owner=user)))
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content)
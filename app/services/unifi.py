@@ -5,35 +5,115 @@ UniFi OS Controller service for automatic port forwarding
 import asyncio
 from abc import ABC
 import ssl
+import time
 from loguru import logger
 from typing import Optional, Dict, Any, List
 import aiohttp
-from aiounifi.controller import Controller, ApiRequest
+from aiounifi.controller import Controller
+from aiounifi.errors import LoginRequired
+from aiounifi.models.api import ApiRequest
 from aiounifi.models.configuration import Configuration
 
 from app.config import settings
+from app.services.unifi_cache import PortForwardCache
+
+PROTOCOLS = {
+    "tcp": "tcp",
+    "udp": "udp",
+    "both": "tcp_udp",
+    "tcp_udp": "tcp_udp"
+}
+
+class PortForwardBatchError(Exception):
+    """Raised when a batch of rules could not be created as a whole"""
+
 
 class UnifiService(ABC):
     """
     Service for managing UniFi port forwarding rules, fully async
     """
 
+    MISS_RESYNC_AFTER = 1.0
+
     def __init__(self):
         """Initialize UniFi controller conn"""
         self.controller: Optional[Controller] = None
         self._session: Optional[aiohttp.ClientSession] = None
         self._connected = False
-        self._ctx = ssl.create_default_context() if settings.unifi_verify_ssl else False
-        self._ctx.check_hostname = False
-        self._ctx.verify_mode = ssl.CERT_NONE
+        self._ctx = ssl.create_default_context()
+        if not settings.unifi_verify_ssl:
+            self._ctx.check_hostname = False
+            self._ctx.verify_mode = ssl.CERT_NONE
         self._logger = logger
+        self._login_lock = asyncio.Lock()
+        self._login_generation = 0
+        self._logged_in_at = 0.0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.rules = PortForwardCache()
+        self._sync_task: Optional[asyncio.Task] = None
 
     async def _ensure(self):
         """
-        Ensure controller is connected
+        Ensure controller is connected and the session is not about to
+        expire, logging in again proactively after `unifi_session_ttl`
         """
         if not self._connected or not self.controller:
             await self.connect()
+        elif time.monotonic() - self._logged_in_at >= settings.unifi_session_ttl:
+            await self._login(self._login_generation)
+
+    async def _login(self, generation: int) -> None:
+        """
+        Single-flight login
+
+        Callers pass the generation they saw fail; if another caller has
+        logged in since, its session is reused instead of hitting /login
+        """
+        async with self._login_lock:
+            if generation != self._login_generation and self._connected:
+                return
+
+            try:
+                await self.controller.login()
+            except Exception:
+                self._connected = False
+                raise
+
+            # 401s are retried here, not by aiounifi's uncoordinated retry
+            self.controller.connectivity.can_retry_login = False
+            self._login_generation += 1
+            self._logged_in_at = time.monotonic()
+            self._connected = True
+
+    async def _send(self, api_request: ApiRequest) -> Dict[str, Any]:
+        """Send a request, logging in again and retrying once on 401"""
+        await self._ensure()
+        generation = self._login_generation
+
+        try:
+            return await self.controller.request(api_request)
+        except LoginRequired:
+            self._logger.info("UniFi session expired, logging in again")
+            await self._login(generation)
+            return await self.controller.request(api_request)
+
+    async def _request(self, api_request: ApiRequest) -> Dict[str, Any]:
+        """
+        Send a request to the controller
+
+        Identical concurrent GETs share a single upstream call
+        """
+        if api_request.method != "get":
+            return await self._send(api_request)
+
+        key = api_request.path
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._send(api_request))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        return await asyncio.shield(future)
 
     async def connect(self):
         """
@@ -44,26 +124,29 @@ class UnifiService(ABC):
             connector = aiohttp.TCPConnector(ssl=self._ctx)
             self._session = aiohttp.ClientSession(connector=connector)
 
-        config = Configuration(
-            session=self._session,
-            host=settings.unifi_host,
-            username=settings.unifi_username,
-            password=settings.unifi_password,
-            port=settings.unifi_port,
-            site=settings.unifi_site,
-            ssl_context=self._ctx
-        )
+        if self.controller is None:
+            config = Configuration(
+                session=self._session,
+                host=settings.unifi_host,
+                username=settings.unifi_username,
+                password=settings.unifi_password,
+                port=settings.unifi_port,
+                site=settings.unifi_site,
+                ssl_context=self._ctx
+            )
+            self.controller = Controller(config)
 
-        self.controller = Controller(config)
-        await self.controller.login()
-        self._connected = True
+        await self._login(self._login_generation)
 
     async def disconnect(self):
         """Disconnect from UniFi controller"""
+        await self.stop_sync()
         if self.controller:
             await self.controller.connectivity.config.session.close()
         if self._session:
             await self._session.close()
+        self._session = None
+        self.controller = None
         self._connected = False
 
     async def create_port_forward(
@@ -81,17 +164,8 @@ class UnifiService(ABC):
         Returns:
             Dict[str, Any]
         """
-        
-        await self._ensure()
 
-        protocolm = {
-            "tcp": "tcp",
-            "udp": "udp",
-            "both": "tcp_udp",
-            "tcp_udp": "tcp_udp"
-        }
-        
-        unifi_proto = protocolm.get(
+        unifi_proto = PROTOCOLS.get(
             protocol.lower(),
             "tcp"
         )
@@ -108,19 +182,72 @@ class UnifiService(ABC):
             "log": False
         }
 
-        response = await self.controller.request(
+        response = await self._request(
             ApiRequest(
                 method="post",
-                path="/api/s/{site}/rest/portforward",
+                path="/rest/portforward",
                 data=portforward
             )
         )
 
         if response and "data" in response and len(response["data"]) > 0:
+            self.rules.upsert(response["data"][0])
             return response["data"][0]
 
         return {}
 
+    async def create_port_forwards(
+        self,
+        rules: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Create several port forwarding rules concurrently, all or nothing
+
+        Args:
+            rules: create_port_forward keyword arguments per rule
+
+        Returns:
+            Created rules, in the order given
+
+        Raises:
+            PortForwardBatchError: A rule failed; rules already created
+                by this batch have been deleted again
+        """
+
+        results = await asyncio.gather(
+            *(self.create_port_forward(**rule) for rule in rules),
+            return_exceptions=True
+        )
+
+        created = [r for r in results if isinstance(r, dict) and r.get("_id")]
+        if len(created) == len(rules):
+            return created
+
+        errors = [str(r) for r in results if isinstance(r, BaseException)]
+        created_ids = [r["_id"] for r in created]
+        if not await self.delete_port_forwards(created_ids):
+            self._logger.error(
+                f"Rollback of a port forward batch left controller rules behind, "
+                f"check rule ids {created_ids}"
+            )
+        raise PortForwardBatchError(
+            f"{len(rules) - len(created)} of {len(rules)} rules failed"
+            + (f": {errors[0]}" if errors else "")
+        )
+
+    async def delete_port_forwards(self, rule_ids: List[str]) -> bool:
+        """
+        Delete several portforwarding rules concurrently
+
+        Returns:
+            bool, True if every rule was deleted
+        """
+
+        results = await asyncio.gather(
+            *(self.delete_port_forward(rule_id) for rule_id in rule_ids)
+        )
+        return all(results)
+
     async def delete_port_forward(self, rule_id: str) -> bool:
         """
         Delete a portforwarding rule
@@ -129,18 +256,17 @@ class UnifiService(ABC):
             bool
         """
 
-        await self._ensure()
-
         try:
-            await self.controller.request(
+            await self._request(
                 ApiRequest(
                     method="delete",
-                    path=f"/api/s/{{site}}/rest/portforward/{rule_id}"
+                    path=f"/rest/portforward/{rule_id}"
                 )
             )
+            self.rules.remove(rule_id)
             return True
         except Exception as e:
-            self._logger.error(f"ERROR deleting port forward: {e}")
+            self._logger.error(f"ERROR deleting port forward {rule_id}: {e}")
             return False
 
     async def update_port_forward(
@@ -156,9 +282,7 @@ class UnifiService(ABC):
             Dict[str, Any]
         """
 
-        await self._ensure()
-
-        rule = self.get_port_forward(rule_id)
+        rule = await self.get_port_forward(rule_id)
         if not rule:
             raise ValueError(f"Port forward rule {rule_id} not found")
 
@@ -169,15 +293,16 @@ class UnifiService(ABC):
 
         upd.update(kwargs)
 
-        response = await self.controller.request(
+        response = await self._request(
             ApiRequest(
                 method="put",
-                path=f"/api/s/{{site}}/rest/portforward/{rule_id}",
+                path=f"/rest/portforward/{rule_id}",
                 data=upd
             )
         )
 
         if response and "data" in response  and len(response["data"]) > 0:
+            self.rules.upsert(response["data"][0])
             return response["data"][0]
 
         return {}
@@ -187,35 +312,133 @@ class UnifiService(ABC):
         rule_id: str
     ) -> Optional[Dict[str, Any]]:
         """
-        Get a specific port forwarding rule
+        Get a specific port forwarding rule from the local mirror
+
+        A miss resyncs once before reporting not-found, since rules made
+        by other workers only reach the mirror on the next sync
 
         Returns:
             Optional[Dict[str, Any]]
         """
 
-        await self._ensure()
+        await self.sync_rules()
+        rule = self.rules.get(rule_id)
+        if rule is None and await self._resync_on_miss():
+            rule = self.rules.get(rule_id)
+        return rule
+
+    async def find_port_forward(
+        self,
+        external_port: int,
+        protocol: str = "tcp"
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Find the rule forwarding an external port from the local mirror
+
+        Returns:
+            Optional[Dict[str, Any]]
+        """
+
+        proto = PROTOCOLS.get(protocol.lower(), "tcp")
+        await self.sync_rules()
+        rule = self.rules.find(external_port, proto)
+        if rule is None and await self._resync_on_miss():
+            rule = self.rules.find(external_port, proto)
+        return rule
+
+    async def _resync_on_miss(self) -> bool:
+        """
+        Force a sync after a lookup miss, unless the mirror is only
+        `MISS_RESYNC_AFTER` seconds old
+
+        Returns:
+            True if the mirror was resynced
+        """
+        if self.rules.age < self.MISS_RESYNC_AFTER:
+            return False
+        await self.sync_rules(force=True)
+        return True
+
+    async def sync_rules(self, force: bool = False) -> None:
+        """
+        Refresh the local rule mirror when it is older than
+        `unifi_rule_sync_interval`, applying the listing as a diff
+        """
+        if force or self.rules.age >= settings.unifi_rule_sync_interval:
+            await self.list_port_forwards()
+
+    async def _sync_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.unifi_rule_sync_interval)
+            try:
+                await self.sync_rules(force=True)
+            except Exception as e:
+                self._logger.error(f"ERROR syncing portforwards: {e}")
+
+    def start_sync(self) -> None:
+        """Keep the rule mirror current in the background"""
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def stop_sync(self) -> None:
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+            self._sync_task = None
+
+    async def fetch_port_forwards(self) -> List[Dict[str, Any]]:
+        """
+        List all port forwarding rules from the controller and refresh
+        the local mirror with the result
+
+        Returns:
+            List[Dict[str, Any]]
+
+        Raises:
+            Exception: If the controller could not be read; an empty list
+                always means the controller has no rules
+        """
 
-        for rule in self.list_port_forwards():
-            if rule.get("_id") == rule_id:
-                return rule
+        response = await self._request(
+            ApiRequest(
+                method="get",
+                path="/rest/portforward"
+            )
+        )
 
-        return None
+        if not response or "data" not in response:
+            raise ValueError("Controller returned no port forward listing")
+
+        self.rules.apply(response["data"])
+        return response["data"]
 
     async def list_port_forwards(self) -> List[Dict[str, Any]]:
         """
-        List all port forwarding rules
+        List all port forwarding rules, or [] if the controller errors
 
         Returns:
             List[Dict[str, Any]]
         """
 
-        await self._ensure()
+        try:
+            return await self.fetch_port_forwards()
+        except Exception as e:
+            self._logger.error(f"ERROR Listing portforwards: {e}")
+            return []
+
+    async def list_clients(self) -> List[Dict[str, Any]]:
+        """
+        List active clients (MAC, IP, hostname) known to the controller
+
+        Returns:
+            List[Dict[str, Any]]
+        """
 
         try:
-            response = await self.controller.request(
+            response = await self._request(
                 ApiRequest(
                     method="get",
-                    path="/api/s/{site}/rest/portforward"
+                    path="/stat/sta"
                 )
             )
 
@@ -225,5 +448,5 @@ class UnifiService(ABC):
             return []
 
         except Exception as e:
-            self._logger.error(f"ERROR Listing portforwards: {e}")
-            return []
\ No newline at end of file
+            self._logger.error(f"ERROR Listing clients: {e}")
+            return []
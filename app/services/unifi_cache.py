@@ -0,0 +1,117 @@
+"""
+Indexed in-memory mirror of UniFi port forwarding rules
+"""
+
+import hashlib
+import json
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+PortKey = Tuple[int, str]
+
+
+def rule_digest(rule: Dict[str, Any]) -> str:
+    """Stable content hash of a rule, used to diff syncs"""
+    return hashlib.sha1(
+        json.dumps(rule, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def port_key(dst_port: Any, proto: str) -> PortKey:
+    return int(dst_port), proto
+
+
+class PortForwardCache:
+    """
+    Port forward rules indexed by `_id` and by (dst_port, proto)
+
+    Syncs are applied as a diff against the previous listing, so index
+    maintenance is proportional to what changed, and an unchanged
+    listing is detected from its overall version hash alone
+    """
+
+    def __init__(self):
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.by_port: Dict[PortKey, str] = {}
+        self._digests: Dict[str, str] = {}
+        self.version: Optional[str] = None
+        self.synced_at: float = 0.0
+
+    @property
+    def age(self) -> float:
+        if not self.synced_at:
+            return float("inf")
+        return time.monotonic() - self.synced_at
+
+    def _index(self, rule: Dict[str, Any]) -> None:
+        rule_id = rule["_id"]
+        old = self.by_id.get(rule_id)
+        if old is not None:
+            self.by_port.pop(port_key(old["dst_port"], old["proto"]), None)
+
+        self.by_id[rule_id] = rule
+        self._digests[rule_id] = rule_digest(rule)
+        self.by_port[port_key(rule["dst_port"], rule["proto"])] = rule_id
+
+    def upsert(self, rule: Dict[str, Any]) -> None:
+        """Write-through for a rule created or updated on the controller"""
+        if rule.get("_id"):
+            self._index(rule)
+            self.version = None
+
+    def remove(self, rule_id: str) -> None:
+        """Write-through for a deleted rule"""
+        rule = self.by_id.pop(rule_id, None)
+        self._digests.pop(rule_id, None)
+        self.version = None
+        if rule is not None:
+            key = port_key(rule["dst_port"], rule["proto"])
+            if self.by_port.get(key) == rule_id:
+                del self.by_port[key]
+
+    def apply(self, rules: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Apply a full controller listing as a diff
+
+        Returns:
+            Counts of added, changed and removed rules
+        """
+        digests = {r["_id"]: rule_digest(r) for r in rules if r.get("_id")}
+        version = hashlib.sha1(
+            "".join(f"{k}:{digests[k]}" for k in sorted(digests)).encode()
+        ).hexdigest()
+
+        self.synced_at = time.monotonic()
+        if version == self.version:
+            return {"added": 0, "changed": 0, "removed": 0}
+
+        added = changed = 0
+        for rule in rules:
+            rule_id = rule.get("_id")
+            if not rule_id:
+                continue
+            previous = self._digests.get(rule_id)
+            if previous == digests[rule_id]:
+                continue
+            if previous is None:
+                added += 1
+            else:
+                changed += 1
+            self._index(rule)
+
+        removed = [rule_id for rule_id in self.by_id if rule_id not in digests]
+        for rule_id in removed:
+            self.remove(rule_id)
+
+        self.version = version
+        return {"added": added, "changed": changed, "removed": len(removed)}
+
+    def get(self, rule_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(rule_id)
+
+    def find(self, dst_port: int, proto: str) -> Optional[Dict[str, Any]]:
+        rule_id = self.by_port.get(port_key(dst_port, proto))
+        return self.by_id.get(rule_id) if rule_id else None
+
+    def all(self) -> List[Dict[str, Any]]:
+        return list(self.by_id.values())
@@ -0,0 +1,87 @@
+"""
+Batch VM stats built from one cluster-wide resource sweep
+"""
+
+from abc import ABC
+from typing import Optional, Dict, Any, List, Iterable
+
+from app.models import VirtualMachine
+from app.models.vm import VMStatus
+from app.schemas import VMStats
+from app.services.proxmox import ProxmoxService
+
+
+class VMStatsService(ABC):
+    """
+    Builds VMStats for many VMs from a single inventory sweep joined
+    in memory with VirtualMachine rows
+    """
+
+    def __init__(self, proxmox: ProxmoxService):
+        self.proxmox = proxmox
+
+    @staticmethod
+    def to_stats(vm: VirtualMachine, status: Optional[Dict[str, Any]]) -> VMStats:
+        """
+        Merge a VM row with its Proxmox status entry
+
+        Totals fall back to the row's configured memory/disk when Proxmox
+        has no entry for the VM. `cpu_usage` is in percent
+
+        Returns:
+            VMStats
+        """
+        status = status or {}
+        cpu = status.get("cpu")
+
+        return VMStats(
+            vmid=vm.vmid,
+            name=vm.name,
+            status=status.get("status", vm.status),
+            cpu_usage=round(cpu * 100, 2) if cpu is not None else None,
+            memory_usage=status.get("mem"),
+            memory_total=status.get("maxmem") or vm.memory * 1024 ** 2,
+            disk_usage=status.get("disk"),
+            disk_total=status.get("maxdisk") or vm.disk * 1024 ** 3,
+            uptime=status.get("uptime"),
+            network_in=status.get("netin"),
+            network_out=status.get("netout"),
+            stale=status.get("stale", not status)
+        )
+
+    async def build(self, vms: Iterable[VirtualMachine]) -> List[VMStats]:
+        """
+        Stats for already-loaded VM rows using one cluster sweep
+
+        Rows without a Proxmox vmid yet are skipped
+
+        Returns:
+            List[VMStats]
+        """
+        by_vmid = {
+            int(entry["vmid"]): entry
+            for entry in await self.proxmox.list_vms()
+        }
+
+        return [
+            self.to_stats(vm, by_vmid.get(vm.vmid))
+            for vm in vms
+            if vm.vmid is not None
+        ]
+
+    async def for_ids(self, vm_ids: List[int]) -> List[VMStats]:
+        """Stats for VirtualMachine ids, in the order given"""
+        rows = {
+            vm.id: vm
+            for vm in await VirtualMachine.filter(id__in=vm_ids)
+        }
+        return await self.build(rows[i] for i in vm_ids if i in rows)
+
+    async def for_owner(self, owner_id: int) -> List[VMStats]:
+        """Stats for every non-deleted VM of an owner"""
+        vms = await VirtualMachine.filter(
+            owner_id=owner_id
+        ).exclude(
+            status=VMStatus.DELETED
+        )
+        return await self.build(vms)
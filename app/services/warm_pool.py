@@ -0,0 +1,214 @@
+"""
+Warm pool of pre-cloned, stopped VMs for instant provisioning
+"""
+
+import asyncio
+from collections import deque
+from typing import Optional, Dict, Any, Deque, Set, Tuple, TYPE_CHECKING
+
+from loguru import logger
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    from app.services.proxmox import ProxmoxService
+
+Profile = Tuple[int, int, int]
+
+
+class WarmPool:
+    """
+    Keeps `vps_warm_pool_size` stopped clones of the template per
+    (memory, cores, disk) profile and refills them in the background.
+    Refills are placed by the cluster scheduler, so a profile's pooled
+    VMs may live on different nodes
+
+    Every worker adopts the same pooled VMs, so a VM is claimed by
+    renaming it with the config `digest` it was read with: Proxmox rejects
+    the rename if another worker renamed it first
+    """
+
+    NAME_PREFIX = "warm"
+
+    def __init__(self, proxmox: "ProxmoxService"):
+        self.proxmox = proxmox
+        self.size = settings.vps_warm_pool_size
+        self.profiles = set(settings.warm_pool_profiles)
+
+        self._ready: Dict[Profile, Deque[Tuple[int, str]]] = {
+            p: deque() for p in self.profiles
+        }
+        self._inflight: Dict[Profile, int] = {p: 0 for p in self.profiles}
+        self._refill_sem = asyncio.Semaphore(settings.vps_warm_pool_refill_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+        self._load_lock = asyncio.Lock()
+        self._loaded = False
+
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and bool(self.profiles)
+
+    @classmethod
+    def pool_name(cls, profile: Profile) -> str:
+        """Proxmox VM name used for pooled clones of a profile"""
+        memory, cores, disk = profile
+        return f"{cls.NAME_PREFIX}-{memory}-{cores}-{disk}"
+
+    async def load(self) -> None:
+        """
+        Adopt pooled VMs that already exist in the cluster and start refilling
+
+        Needs a live cluster sweep: if Proxmox cannot be reached nothing is
+        adopted or cloned, and the next call tries again
+        """
+        if self._loaded or not self.enabled:
+            return
+
+        async with self._load_lock:
+            if self._loaded:
+                return
+
+            try:
+                await self.proxmox.cluster.refresh()
+            except Exception as e:
+                logger.warning(f"Warm pool load failed, retrying later: {e}")
+                return
+
+            names = {self.pool_name(p): p for p in self.profiles}
+            for vm in self.proxmox.cluster.vms.values():
+                profile = names.get(vm.get("name"))
+                if profile and vm.get("status") == "stopped" and not vm.get("lock"):
+                    self._ready[profile].append((int(vm["vmid"]), vm["node"]))
+            self._loaded = True
+
+        for profile in self.profiles:
+            self._schedule_refill(profile)
+
+    async def acquire(
+        self,
+        name: str,
+        memory: int,
+        cores: int,
+        disk: int
+    ) -> Optional[Tuple[int, str]]:
+        """
+        Take a pooled VM for the profile and rename it
+
+        Returns:
+            (vmid, node) on a pool hit, None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        await self.load()
+
+        profile = (memory, cores, disk)
+        ready = self._ready.get(profile)
+
+        while ready:
+            vmid, node = ready.popleft()
+            try:
+                claimed = await self._claim(vmid, node, profile, name)
+            except Exception as e:
+                logger.warning(f"Discarding warm pool VM {vmid}: {e}")
+                continue
+            if not claimed:
+                logger.info(f"Warm pool VM {vmid} was taken by another worker")
+                continue
+
+            # Only the worker that won the claim replaces the VM
+            self._schedule_refill(profile)
+            self.hits += 1
+            return vmid, node
+
+        self.misses += 1
+        if profile in self.profiles and self._loaded:
+            self._schedule_refill(profile)
+        return None
+
+    async def _claim(self, vmid: int, node: str, profile: Profile, name: str) -> bool:
+        """
+        Rename a pooled VM if it is still pooled, as a check-and-set
+
+        Returns:
+            False if it is no longer a pooled VM of this profile
+
+        Raises:
+            Exception: If the rename is rejected, e.g. on a digest mismatch
+        """
+        config = await self.proxmox.get_vm_config(vmid, node=node, cached=False)
+        if config.get("name") != self.pool_name(profile) or config.get("lock"):
+            return False
+
+        await self.proxmox.update_vm_config(
+            vmid, node=node, name=name, digest=config["digest"]
+        )
+        return True
+
+    def _schedule_refill(self, profile: Profile) -> None:
+        """Start clones until ready + in-flight reaches the pool size"""
+        missing = self.size - len(self._ready[profile]) - self._inflight[profile]
+        for _ in range(max(missing, 0)):
+            self._inflight[profile] += 1
+            task = asyncio.create_task(self._refill_one(profile))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _refill_one(self, profile: Profile) -> None:
+        memory, cores, disk = profile
+        vmid = None
+        try:
+            async with self._refill_sem:
+                node = await self.proxmox.scheduler.pick_node(memory, cores, disk)
+                vmid, task = await self.proxmox.clone_next(
+                    self.pool_name(profile), node=node
+                )
+
+                await self.proxmox.finish_clone(
+                    vmid, task, memory, cores, disk, timeout=600, node=node
+                )
+
+            self._ready[profile].append((vmid, node))
+            self.refills += 1
+        except Exception as e:
+            self.refill_failures += 1
+            logger.error(f"Warm pool refill for {profile} failed: {e}")
+            if vmid is not None:
+                await self._discard(vmid, node)
+        finally:
+            self._inflight[profile] -= 1
+
+    async def _discard(self, vmid: int, node: str) -> None:
+        """Delete a partly cloned VM after a failed refill"""
+        try:
+            await self.proxmox.delete_vm(vmid, node=node)
+        except Exception as e:
+            logger.error(f"Could not delete failed warm pool clone {vmid}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool hit/miss counters and per-profile fill levels"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "refills": self.refills,
+            "refill_failures": self.refill_failures,
+            "profiles": {
+                self.pool_name(p): {
+                    "ready": len(self._ready[p]),
+                    "inflight": self._inflight[p],
+                    "target": self.size
+                }
+                for p in self.profiles
+            }
+        }
+
+    async def close(self) -> None:
+        """Cancel in-flight refills"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
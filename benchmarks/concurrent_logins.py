@@ -0,0 +1,90 @@
+"""
+Concurrent login DB path: single-statement upsert vs select-then-save
+
+Each login upserts the User row for a Discord account. Accounts are
+reused across logins, so the same rows are hit concurrently, which is
+where select-then-create races into unique violations.
+
+    python -m benchmarks.concurrent_logins --db-url postgres://... --logins 2000
+
+Point --db-url at a scratch database; tables are generated there.
+Needs the usual settings in the environment or .env
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from tortoise import Tortoise
+from tortoise.exceptions import IntegrityError
+
+from app.models import User
+from app.schemas import DiscordUser
+from app.services.auth import AuthService
+
+
+async def legacy_login(d_user: DiscordUser) -> User:
+    """The pre-upsert path: read, then create or save twice"""
+    user = await User.filter(discord_id=d_user.id).first()
+    if user:
+        user.discord_username = d_user.username
+        user.discord_avatar = d_user.avatar
+        user.email = d_user.email
+        await user.update_last_login()
+        await user.save()
+        return user
+
+    return await User.create(
+        discord_id=d_user.id,
+        discord_username=d_user.username,
+        discord_avatar=d_user.avatar,
+        email=d_user.email,
+        last_login=datetime.utcnow()
+    )
+
+
+async def run(login, args, prefix: str) -> tuple:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        d_user = DiscordUser(id=f"{prefix}{i % args.accounts}", username=f"user{i}")
+        async with semaphore:
+            try:
+                await login(d_user)
+            except IntegrityError:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.logins)))
+    return time.perf_counter() - started, errors
+
+
+async def main(args) -> None:
+    await Tortoise.init(db_url=args.db_url, modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas(safe=True)
+
+    try:
+        for label, login, prefix in (
+            ("select + save", legacy_login, "9001"),
+            ("upsert", AuthService.create_or_update_user, "9002"),
+        ):
+            elapsed, errors = await run(login, args, prefix)
+            print(
+                f"{label:>14}: {args.logins} logins in {elapsed:.2f}s "
+                f"({args.logins / elapsed:.0f}/s), {errors} unique violations"
+            )
+    finally:
+        await User.filter(discord_id__startswith="900").delete()
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    parser.add_argument("--logins", type=int, default=2000)
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
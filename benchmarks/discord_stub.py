@@ -0,0 +1,52 @@
+"""
+Local stand-in for the Discord OAuth endpoints, for offline login tests
+and benchmarks
+
+Serves the two calls AuthService makes:
+    POST /api/oauth2/token      code -> access token "tok-<code>"
+    GET  /api/v10/users/@me     bearer token -> deterministic user
+
+Point `DISCORD_API_BASE` at it, e.g. https://127.0.0.1:8443/api
+"""
+
+import hashlib
+
+from fastapi import FastAPI, Request, HTTPException
+
+app = FastAPI(title="Discord stand-in")
+
+
+def user_for(code: str) -> dict:
+    digest = hashlib.sha1(code.encode()).hexdigest()
+    return {
+        "id": str(int(digest[:15], 16)),
+        "username": f"user-{code}",
+        "avatar": None,
+        "email": f"{code}@example.invalid",
+        "verified": True,
+    }
+
+
+@app.post("/api/oauth2/token")
+async def token(request: Request):
+    form = await request.form()
+    code = form.get("code")
+    if not code or form.get("grant_type") != "authorization_code":
+        raise HTTPException(status_code=400, detail="invalid_grant")
+
+    return {
+        "access_token": f"tok-{code}",
+        "token_type": "Bearer",
+        "expires_in": 604800,
+        "refresh_token": f"ref-{code}",
+        "scope": "identify email",
+    }
+
+
+@app.get("/api/v10/users/@me")
+async def me(request: Request):
+    auth = request.headers.get("authorization", "")
+    if not auth.startswith("Bearer tok-"):
+        raise HTTPException(status_code=401, detail="401: Unauthorized")
+
+    return user_for(auth[len("Bearer tok-"):])
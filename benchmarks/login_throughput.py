@@ -0,0 +1,138 @@
+"""
+Discord login throughput: shared pooled client vs a client per request
+
+Runs the Discord stand-in over TLS on localhost (self-signed cert made
+on the fly) and performs code exchange + user lookup for many logins.
+
+    python -m benchmarks.login_throughput --logins 1000 --concurrency 50
+
+The stand-in runs in the same process, so on small machines client and
+server compete for CPU; compare the two modes against each other rather
+than reading the absolute numbers. The stand-in only speaks HTTP/1.1.
+
+Needs the usual settings in the environment or .env
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import socket
+import tempfile
+import time
+
+import httpx
+import uvicorn
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from benchmarks.discord_stub import app as stub
+
+
+def make_cert(directory: str):
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    with open(certfile, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(keyfile, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        ))
+    return certfile, keyfile
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_logins(login, n: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await login(f"bench{i}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return time.perf_counter() - started
+
+
+async def main(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        certfile, keyfile = make_cert(tmp)
+        os.environ["SSL_CERT_FILE"] = certfile
+
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(
+            stub, host="127.0.0.1", port=port, log_level="warning",
+            ssl_certfile=certfile, ssl_keyfile=keyfile
+        ))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+
+        from app.config import settings
+        from app.services.auth import AuthService
+        from app.services.discord_http import DiscordHTTP
+
+        settings.discord_api_base = f"https://localhost:{port}/api"
+
+        async def pooled(code: str):
+            token = await AuthService.exchange_code_for_token(code)
+            await AuthService.get_discord_user(token.access_token)
+
+        async def fresh(code: str):
+            # What every login paid before the shared client
+            base = settings.discord_api_base
+            async with httpx.AsyncClient() as client:
+                r = await client.post(f"{base}/oauth2/token", data={
+                    "grant_type": "authorization_code", "code": code
+                })
+                token = r.json()["access_token"]
+            async with httpx.AsyncClient() as client:
+                await client.get(
+                    f"{base}/v10/users/@me",
+                    headers={"Authorization": f"Bearer {token}"}
+                )
+
+        try:
+            for label, login in (("client per request", fresh), ("shared client", pooled)):
+                await run_logins(login, min(args.concurrency, args.logins), args.concurrency)
+                elapsed = await run_logins(login, args.logins, args.concurrency)
+                print(
+                    f"{label:>20}: {args.logins} logins in {elapsed:.2f}s "
+                    f"({args.logins / elapsed:.0f}/s, {elapsed / args.logins * 1000:.1f} ms each)"
+                )
+        finally:
+            await DiscordHTTP.close()
+            server.should_exit = True
+            await serving
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
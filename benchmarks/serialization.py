@@ -0,0 +1,142 @@
+"""
+Listing serialization: to_dict / pydantic models vs values_list + orjson
+
+Fills an in-memory database with VMs, port forwards, audit entries and
+users, then times turning each full listing into JSON bytes three ways:
+model instances through to_dict() and json.dumps, the
+pydantic_model_creator models, and the bulk row serializer.
+
+    python -m benchmarks.serialization --rows 5000 --repeat 5
+
+Needs the usual settings in the environment or .env
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+from tortoise import Tortoise
+
+from app.models import User, VirtualMachine, PortForward, AuditLog
+from app.models.audit import AuditAction, AuditLog_Pydantic
+from app.models.port import PortForward_Pydantic
+from app.models.user import User_Pydantic
+from app.models.vm import VirtualMachine_Pydantic, VMStatus
+from app.services.serialization import dump_rows
+
+PYDANTIC = {
+    User: User_Pydantic,
+    VirtualMachine: VirtualMachine_Pydantic,
+    PortForward: PortForward_Pydantic,
+    AuditLog: AuditLog_Pydantic,
+}
+
+
+async def seed(rows: int) -> None:
+    now = datetime.now(timezone.utc)
+    await User.bulk_create([
+        User(
+            discord_id=str(10 ** 17 + i),
+            discord_username=f"user{i}",
+            discord_avatar="a" * 32 if i % 2 else None,
+            email=f"user{i}@example.com",
+            last_login=now
+        )
+        for i in range(rows)
+    ])
+    owner = await User.first()
+
+    await VirtualMachine.bulk_create([
+        VirtualMachine(
+            vmid=1000 + i,
+            node="pve1",
+            name=f"vm-{i}",
+            ssh_port=20000 + i,
+            ip_address=f"10.0.{i // 250}.{i % 250}",
+            status=VMStatus.RUNNING,
+            owner=owner,
+            started_at=now
+        )
+        for i in range(rows)
+    ])
+    vm = await VirtualMachine.first()
+
+    await PortForward.bulk_create([
+        PortForward(
+            unifi_rule_id=f"rule{i}",
+            external_port=30000 + i,
+            internal_port=22,
+            internal_ip="10.0.0.2",
+            virtual_machine=vm
+        )
+        for i in range(rows)
+    ])
+    await AuditLog.bulk_create([
+        AuditLog(
+            action=AuditAction.VM_STARTED,
+            description=f"Started vm-{i}",
+            user_id=owner.id,
+            resource_type="vm",
+            resource_id=i,
+            ip_address="203.0.113.7",
+            metadata={"node": "pve1", "vmid": 1000 + i},
+            created_at=now
+        )
+        for i in range(rows)
+    ])
+
+
+async def via_to_dict(model) -> bytes:
+    items = [obj.to_dict() for obj in await model.all()]
+    return json.dumps(items, default=str).encode()
+
+
+async def via_pydantic(model) -> bytes:
+    items = await PYDANTIC[model].from_queryset(model.all())
+    return json.dumps([item.model_dump(mode="json") for item in items]).encode()
+
+
+async def via_rows(model) -> bytes:
+    return await dump_rows(model.all())
+
+
+async def timed(func, model, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func(model)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def main(args) -> None:
+    await Tortoise.init(db_url=args.db_url, modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas()
+
+    try:
+        await seed(args.rows)
+        print(f"{args.rows} rows per model, best of {args.repeat}")
+        for model in (VirtualMachine, PortForward, AuditLog, User):
+            results = [
+                (label, await timed(func, model, args.repeat))
+                for label, func in (
+                    ("to_dict", via_to_dict),
+                    ("pydantic", via_pydantic),
+                    ("rows", via_rows),
+                )
+            ]
+            print(f"{model.__name__:>15}: " + ", ".join(
+                f"{label} {elapsed * 1000:.1f}ms" for label, elapsed in results
+            ))
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
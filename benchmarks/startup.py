@@ -0,0 +1,86 @@
+"""
+Worker startup time: import time and time to first request
+
+Each run is a fresh interpreter that imports the app, opens the lifespan
+against a scratch database and serves one listing request in-process.
+Upstream clients warm up in the background, so Proxmox and UniFi do not
+need to be reachable.
+
+    python -m benchmarks.startup --runs 5
+
+Needs the usual settings in the environment or .env
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+
+async def child(db_url: str) -> dict:
+    started = time.perf_counter()
+
+    from fastapi import FastAPI
+    from app.lifespan import lifespan
+    from app.models import VirtualMachine
+    imported = time.perf_counter()
+
+    import httpx
+    from tortoise import Tortoise
+
+    await Tortoise.init(db_url=db_url, modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/vms")
+    async def list_vms():
+        from app.models.vm import VirtualMachine_Pydantic
+        return await VirtualMachine_Pydantic.from_queryset(VirtualMachine.all())
+
+    try:
+        async with lifespan(app):
+            ready = time.perf_counter()
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+                response = await client.get("/vms")
+                response.raise_for_status()
+            first = time.perf_counter()
+    finally:
+        await Tortoise.close_connections()
+
+    return {
+        "import": imported - started,
+        "ready": ready - started,
+        "first_request": first - started,
+    }
+
+
+def main(args) -> None:
+    results = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup", "--child", "--db-url", args.db_url],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"median of {args.runs} fresh interpreters")
+    for key in ("import", "ready", "first_request"):
+        print(f"{key:>14}: {statistics.median(r[key] for r in results) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db-url", default="sqlite://:memory:")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        import asyncio
+        print(json.dumps(asyncio.run(child(args.db_url))))
+    else:
+        main(args)
@@ -0,0 +1,65 @@
+from tortoise import BaseDBAsyncClient
+
+RUN_IN_TRANSACTION = True
+
+
+# Hand-written: turns audit_logs into a table range-partitioned by month on
+# created_at, with partitions from its oldest row to three months ahead.
+# The app creates later partitions and retires old ones (AuditPartitions)
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        LOCK TABLE "audit_logs" IN ACCESS EXCLUSIVE MODE;
+        ALTER TABLE "audit_logs" RENAME TO "audit_logs_legacy";
+        CREATE TABLE "audit_logs" (LIKE "audit_logs_legacy" INCLUDING DEFAULTS)
+            PARTITION BY RANGE ("created_at");
+        ALTER TABLE "audit_logs" ADD PRIMARY KEY ("id", "created_at");
+        ALTER TABLE "audit_logs" ADD FOREIGN KEY ("user_id")
+            REFERENCES "users" ("id") ON DELETE SET NULL;
+        CREATE INDEX ON "audit_logs" ("created_at");
+        CREATE INDEX ON "audit_logs" ("user_id", "created_at");
+        DO $$
+        DECLARE
+            seq text := pg_get_serial_sequence('audit_logs_legacy', 'id');
+            m date := date_trunc(
+                'month', coalesce((SELECT min("created_at") FROM "audit_logs_legacy"), now()) AT TIME ZONE 'UTC'
+            )::date;
+            until date := (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months')::date;
+        BEGIN
+            WHILE m <= until LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF "audit_logs" FOR VALUES FROM (%L) TO (%L)',
+                    'audit_logs_p' || to_char(m, 'YYYYMM'),
+                    m || ' 00:00:00+00',
+                    (m + interval '1 month')::date || ' 00:00:00+00'
+                );
+                m := (m + interval '1 month')::date;
+            END LOOP;
+            INSERT INTO "audit_logs" SELECT * FROM "audit_logs_legacy";
+            IF seq IS NOT NULL THEN
+                EXECUTE format('ALTER SEQUENCE %s OWNED BY "audit_logs"."id"', seq);
+            END IF;
+        END $$;
+        DROP TABLE "audit_logs_legacy";"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        LOCK TABLE "audit_logs" IN ACCESS EXCLUSIVE MODE;
+        ALTER TABLE "audit_logs" RENAME TO "audit_logs_partitioned";
+        CREATE TABLE "audit_logs" (LIKE "audit_logs_partitioned" INCLUDING DEFAULTS);
+        ALTER TABLE "audit_logs" ADD PRIMARY KEY ("id");
+        ALTER TABLE "audit_logs" ADD FOREIGN KEY ("user_id")
+            REFERENCES "users" ("id") ON DELETE SET NULL;
+        CREATE INDEX ON "audit_logs" ("created_at");
+        INSERT INTO "audit_logs" SELECT * FROM "audit_logs_partitioned";
+        DO $$
+        DECLARE
+            seq text := pg_get_serial_sequence('audit_logs_partitioned', 'id');
+        BEGIN
+            IF seq IS NOT NULL THEN
+                EXECUTE format('ALTER SEQUENCE %s OWNED BY "audit_logs"."id"', seq);
+            END IF;
+        END $$;
+        DROP TABLE "audit_logs_partitioned";"""